@@ -1,4 +1,7 @@
 async function updateNavActions() {
+  // 经页面路由返回的页面已在服务端渲染登录状态（data-nav="server"），只有未经服务端渲染的页面才请求 /api/me
+  const serverNav = document.getElementById('navActions');
+  if (serverNav && serverNav.dataset.nav === 'server') return;
   try {
     const resp = await fetch('/api/me', { credentials: 'include' });
     if (!resp.ok) return;
@@ -12,6 +12,9 @@ let currentFile = null;
 
 // 1. 未登录检测：跳转到登录页
 (async function checkLoginStatus() {
+  // /identify 路由已在服务端校验登录（未登录时重定向），服务端渲染的页面不必再请求 /api/me
+  const serverNav = document.getElementById('navActions');
+  if (serverNav && serverNav.dataset.nav === 'server') return;
   try {
     const response = await fetch('/api/me', { credentials: 'include' });
     if (!response.ok) {
@@ -0,0 +1,59 @@
+import asyncio
+
+
+class Overloaded(Exception):
+    """请求被拒绝或超时：调用方应返回 429 / 503 并带上 Retry-After"""
+
+    def __init__(self, message, status_code=503, retry_after=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """推理路径的准入控制
+
+    同时处理中的请求数（解码、排队、前向传播；上传内容在进入准入控制前读完）超过 max_pending 时新请求立即被拒绝（429），
+    不再排进队列拖慢所有人；已接纳的请求超过 timeout_s 仍未完成则放弃等待（503）。
+    推理批处理器队列已满（asyncio.QueueFull）同样按 429 处理。
+    """
+
+    def __init__(self, max_pending=64, timeout_s=10.0, retry_after=1):
+        self.max_pending = max(1, int(max_pending))
+        self.timeout_s = float(timeout_s) if timeout_s else None
+        self.retry_after = max(1, int(retry_after))
+        self.pending = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def check(self):
+        """不占用名额，只检查当前是否已满；已满时抛出 Overloaded（批量接口在开始流式响应前调用）"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded("服务繁忙，请稍后重试", 429, self.retry_after)
+
+    async def run(self, func, *args):
+        """在准入限制下运行协程函数 func(*args)，过载时抛出 Overloaded"""
+        self.check()
+        self.pending += 1
+        self.admitted += 1
+        try:
+            return await asyncio.wait_for(func(*args), self.timeout_s)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded("推理队列已满，请稍后重试", 429, self.retry_after)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded("推理超时，请稍后重试", 503, self.retry_after)
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
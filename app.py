@@ -1,67 +1,198 @@
-from fastapi import FastAPI, Request, Form, HTTPException
+from fastapi import FastAPI, Request, Form, HTTPException, Query
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.responses import Response
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import pymysql
 import hashlib
 import re
 import os
-import io
+import time
+import asyncio
+import zipfile
+from contextlib import asynccontextmanager
+import serve_config
+import inference
+from batcher import InferenceBatcher
+from admission import AdmissionController, Overloaded
+from upload_guard import UploadRejected, ContentLengthLimit, read_limited, iter_upload_file
+from metrics import Registry, batch_size_buckets
+from page_cache import PageCache, hidden_field, nav_user_box
+from compression import GZipFallback, not_modified
+from asset_manifest import AssetManifest, ManifestStaticFiles, asset_response
+from image_variants import DerivativeCache, negotiate_format, rewrite_html, media_types
+from prediction_cache import PredictionCache
+from model_client import ModelClient
+from bulk_predict import iter_upload_items, stream_predictions
+from typing import List
+
+# --------------------------
+# 启动阶段：提前加载并预热模型，首个用户无需等待模型构建
+# --------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"静态资源清单: {_assets.build()} 个文件")
+    # 页面改写可能解码图片（生成占位图），放到线程中进行
+    print(f"已预加载 {await asyncio.to_thread(_pages.load_all)} 个页面")
+    if _model_client is None:
+        report = await _run_inference(inference.startup, serve_config.warmup_passes)
+        _readiness.update(report)
+        _batcher.start()
+    else:
+        await _model_ready()
+        report = _readiness
+    if report.get('ready'):
+        print(f"模型就绪，冷启动耗时 {report.get('total_s')}s: {report}")
+    else:
+        print(f"模型未就绪，仅提供页面服务: {report.get('error')}")
+    version_task = assets_task = pages_task = None
+    if serve_config.reload_interval_s > 0:
+        version_task = asyncio.get_running_loop().create_task(_track_model_version())
+    if serve_config.asset_check_interval_s > 0:
+        assets_task = asyncio.get_running_loop().create_task(_watch_assets())
+    if serve_config.page_check_interval_s > 0:
+        pages_task = asyncio.get_running_loop().create_task(_watch_pages())
+    yield
+    for task in (version_task, assets_task, pages_task):
+        if task is not None:
+            task.cancel()
+    await _batcher.stop()
+    await _similar_batcher.stop()
+    if _model_client is not None:
+        await _model_client.close()
+    _executor.shutdown(wait=False, cancel_futures=True)
 
 # 初始化FastAPI应用
-app = FastAPI(title="动物科普网")
-app.mount("/static/css", StaticFiles(directory="All_css"), name="static_css")
-app.mount("/static/js", StaticFiles(directory="All_js"), name="static_js")
-app.mount("/static/images", StaticFiles(directory="picture"), name="static_images")
-# --------------------------
-# ML 模型初始化（懒加载，避免导入失败导致 ASGI 无法启动）
-# --------------------------
-_model = None
-class_names = ['飞机', '汽车', '鸟', '猫', '鹿', '狗', '青蛙', '马', '船', '卡车']
-weight_path = 'cifar10_best.pt'
-device = None
-data_transforms = None
-
-def _ensure_model_loaded():
-    global _model, device, data_transforms
-    if _model is not None:
-        return True
-    try:
-        os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-        import torch
-        from torch import nn
-        from torchvision import models
-        from torchvision.models import ResNet18_Weights
-        from torchvision import transforms
-        device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
-        data_transforms = {
-            'test': transforms.Compose([
-                transforms.Resize((32, 32)),
-                transforms.ToTensor(),
-                transforms.Normalize((0.4914, 0.4822, 0.4465), (0.2023, 0.1994, 0.2010))
-            ])
-        }
-        def initialize_model(num_classes):
-            model = models.resnet18(weights=ResNet18_Weights.IMAGENET1K_V1)
-            for p in model.parameters():
-                p.requires_grad = False
-            num_ftrs = model.fc.in_features
-            model.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(num_ftrs, num_classes))
-            return model.to(device)
-        _loc_model = initialize_model(len(class_names))
-        import os as _os
-        import torch as _torch
-        if _os.path.exists(weight_path):
-            checkpoint = _torch.load(weight_path, map_location=device)
-            _loc_model.load_state_dict(checkpoint['state_dict'])
-            _loc_model.eval()
-        _model = _loc_model
-        return True
-    except Exception as e:
-        print(f"模型加载失败或未安装依赖: {e}")
-        _model = None
-        return False
+app = FastAPI(title="动物科普网", lifespan=lifespan)
+# 静态资源清单：启动时扫描，请求时查表（含 404 结果）；页面中的资源引用换成带内容哈希的指纹 URL，长期缓存
+# 文本资源优先发送 compress_assets.py 生成的 .br / .gz 预压缩文件
+# 只索引各静态目录与根目录下的文件（不递归），数据集与模型目录不经由静态路由发送
+_assets = AssetManifest({
+    "/static/css/": "All_css", "/static/js/": "All_js", "/static/images/": "picture",
+    "/All_css/": "All_css", "/All_js/": "All_js", "/All_html/": "All_html", "/picture/": "picture", "/": ".",
+}, serve_config.asset_check_interval_s)
+app.mount("/static/css", ManifestStaticFiles(directory="All_css", manifest=_assets, prefix="/static/css/"),
+          name="static_css")
+app.mount("/static/js", ManifestStaticFiles(directory="All_js", manifest=_assets, prefix="/static/js/"),
+          name="static_js")
+app.mount("/static/images", ManifestStaticFiles(directory="picture", manifest=_assets, prefix="/static/images/"),
+          name="static_images")
+# --------------------------
+# ML 推理：解码、预处理与前向传播都在独立的推理执行器中进行，不占用事件循环
+# --------------------------
+_executor = inference.create_executor(
+    serve_config.executor_kind, serve_config.executor_workers, serve_config.warmup_passes,
+    load_model=not serve_config.model_server_socket)
+# 启动阶段填充：模型是否就绪及冷启动耗时
+_readiness = {'ready': False}
+
+# 指标：单张图片预测各阶段耗时、批大小与排队时间的直方图，GET /metrics 导出
+_metrics = Registry()
+_stage_seconds = _metrics.histogram(
+    'animal_predict_stage_seconds',
+    '单张图片预测各阶段耗时（秒）：read 读取请求体、decode 解码、transform 张量变换、'
+    'forward 批次前向传播、infer 从提交到拿到结果、serialize 响应序列化',
+    labelnames=('stage',))
+_stages = {stage: _stage_seconds.labels(stage)
+           for stage in ('read', 'decode', 'transform', 'forward', 'infer', 'serialize')}
+_request_seconds = _metrics.histogram(
+    'animal_predict_request_seconds', '预测接口总耗时（秒），按响应状态码区分', labelnames=('status',))
+_batch_size = _metrics.histogram('animal_batch_size', '推理批次大小', buckets=batch_size_buckets)
+_queue_wait = _metrics.histogram('animal_batch_queue_wait_seconds', '请求在批处理队列中的等待时间（秒）')
+
+def _observe_batch(batch_size, waits, compute_s):
+    _batch_size.observe(batch_size)
+    for wait in waits:
+        _queue_wait.observe(wait)
+    _stages['forward'].observe(compute_s)
+
+# 动态微批处理：并发的预测请求合并为一个批次推理
+_batcher = InferenceBatcher(
+    inference.predict_batch,
+    max_batch_size=serve_config.max_batch_size,
+    max_wait_ms=serve_config.max_wait_ms,
+    executor=_executor,
+    max_queue=serve_config.max_queue_depth,
+    queue_timeout_ms=serve_config.request_timeout_s * 1000,
+    observer=_observe_batch,
+)
+
+# 设置了独立模型服务时，本进程只做解码与预处理，前向传播交给 model_server.py
+_model_client = ModelClient(serve_config.model_server_socket) if serve_config.model_server_socket else None
+_infer = _batcher.submit if _model_client is None else _model_client.predict
+
+# 准入控制：限制同时处理的预测请求数，过载时快速拒绝而不是排队拖垮所有请求
+_admission = AdmissionController(
+    max_pending=serve_config.max_pending_requests,
+    timeout_s=serve_config.request_timeout_s,
+    retry_after=serve_config.retry_after_s,
+)
+
+# 两级预测缓存：原始字节哈希 -> 结果；量化输入张量哈希 -> 结果
+_prediction_cache = PredictionCache(
+    maxsize=serve_config.prediction_cache_size,
+    ttl=serve_config.prediction_cache_ttl_s,
+)
+
+async def _run_inference(func, *args):
+    """在推理执行器中运行 func，事件循环只负责等待结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+async def _model_ready(refresh=False):
+    """模型是否可用；远程模式下未就绪（或要求刷新）时重新询问模型服务"""
+    if _model_client is not None and (refresh or not _readiness['ready']):
+        try:
+            _readiness.clear()
+            _readiness.update(await _model_client.status())
+        except (ConnectionError, RuntimeError, asyncio.TimeoutError) as e:
+            _readiness.update({'ready': False, 'error': str(e)})
+    return _readiness['ready']
+
+async def _current_model_info():
+    if _model_client is not None:
+        return (await _model_client.status()).get('model', {})
+    if serve_config.executor_kind == 'process':
+        # 进程池中每个 worker 各有一份模型：版本由主进程读取模型文件得到；
+        # 文件仍是启动时加载的版本时带上启动报告中的加载耗时
+        try:
+            info = await asyncio.to_thread(inference.model_file_info)
+        except OSError:
+            return {}
+        loaded = _readiness.get('model', {})
+        return dict(loaded, **info) if loaded.get('version') == info['version'] else info
+    return await _run_inference(inference.get_model_info)
+
+async def _track_model_version():
+    """模型热更新后缓存里是旧版本的结果：定期查询当前版本，变化时清空预测缓存"""
+    while True:
+        await asyncio.sleep(serve_config.reload_interval_s)
+        try:
+            version = (await _current_model_info()).get('version')
+        except (ConnectionError, RuntimeError, asyncio.TimeoutError):
+            continue
+        if version:
+            _prediction_cache.observe_version(version)
+
+async def _watch_assets():
+    """静态资源修改检查：stat 与重新计算哈希在线程中进行，结果回到事件循环写入清单"""
+    while True:
+        await asyncio.sleep(serve_config.asset_check_interval_s)
+        _assets.apply(await asyncio.to_thread(_assets.scan))
+
+async def _watch_pages():
+    """页面修改检查：源文件或静态资源清单版本变化的页面在线程中重新读取与改写，结果回到事件循环替换"""
+    while True:
+        await asyncio.sleep(serve_config.page_check_interval_s)
+        _pages.apply(await asyncio.to_thread(_pages.scan))
+
+# 声明的请求体过大时在读取之前直接返回 413（multipart 额外留出边界与表单头的开销）
+app.add_middleware(ContentLengthLimit, limits={
+    "/api/predict": serve_config.max_upload_bytes + 64 * 1024,
+    "/api/predict/raw": serve_config.max_upload_bytes,
+})
+
+# 动态 JSON / HTML 响应超过阈值时即时 gzip（页面与静态资源已预先压缩）
+app.add_middleware(GZipFallback, minimum_size=serve_config.gzip_min_bytes)
 
 # 配置CORS，允许前端请求
 app.add_middleware(
@@ -82,10 +213,21 @@ def get_current_user(request: Request):
         return {"id": user_id, "username": username}
     return None
 
-def render_html(filename: str) -> HTMLResponse:
-    file_path = os.path.join("All_html", filename)
-    with open(file_path, "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+# 页面缓存：页面在启动时读入内存，带 ETag / Last-Modified，条件请求返回 304；源文件修改后自动重新读取
+# 登录页按 </form> 预先切分，带 next 参数时直接拼接隐藏域
+# 页面中的 picture/ 图片在加载时改写为 /img 响应式图片（srcset + 模糊占位图），CSS / JS 引用改写为指纹 URL；
+# 静态资源内容变化时页面随之重新改写；导航栏 navActions 中的登录/注册按钮是可替换区域，已登录时换成用户信息
+_images = DerivativeCache("picture", serve_config.image_cache_dir, serve_config.image_cache_max_bytes)
+_pages = PageCache("All_html", markers={"login.html": "</form>"},
+                   transform=lambda name, body: _assets.rewrite_html(rewrite_html(body, _images)),
+                   depends_on=lambda: _assets.version, slot=('id="navActions"', '</div>'))
+
+def render_html(filename: str, request: Request = None) -> Response:
+    # 导航栏的登录状态在服务端渲染，页面加载后不必再请求 /api/me
+    user = get_current_user(request) if request is not None else None
+    if user:
+        return _pages.fill_slot(request, filename, nav_user_box(user["username"]))
+    return _pages.response(request, filename)
 
 
 # MySQL数据库连接配置
@@ -124,51 +266,45 @@ def validate_password(password: str) -> bool:
 # 页面路由
 # --------------------------
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    return render_html("home.html")
+async def root(request: Request):
+    return render_html("home.html", request)
 
 @app.get("/home", response_class=HTMLResponse)
-async def home():
-    return render_html("home.html")
+async def home(request: Request):
+    return render_html("home.html", request)
 
 @app.get("/land", response_class=HTMLResponse)
-async def land():
-    return render_html("land.html")
+async def land(request: Request):
+    return render_html("land.html", request)
 
 @app.get("/ocean", response_class=HTMLResponse)
-async def ocean():
-    return render_html("ocean.html")
+async def ocean(request: Request):
+    return render_html("ocean.html", request)
 
 @app.get("/birds", response_class=HTMLResponse)
-async def birds():
-    return render_html("birds.html")
+async def birds(request: Request):
+    return render_html("birds.html", request)
 
 @app.get("/protect", response_class=HTMLResponse)
-async def protect():
-    return render_html("protect.html")
+async def protect(request: Request):
+    return render_html("protect.html", request)
 
 @app.get("/news", response_class=HTMLResponse)
-async def news():
-    return render_html("news.html")
+async def news(request: Request):
+    return render_html("news.html", request)
 
 @app.get("/about", response_class=HTMLResponse)
-async def about():
-    return render_html("about.html")
+async def about(request: Request):
+    return render_html("about.html", request)
 
 @app.get("/login", response_class=HTMLResponse)
-async def show_login(error: str = None, success: str = None, next: str = None):
-    with open("All_html/login.html", "r", encoding="utf-8") as f:
-        content = f.read()
-        if next:
-            # 在表单中注入隐藏域（若页面无隐藏域，则简单附加提示）
-            content = content.replace('</form>', f'\n<input type="hidden" name="next" value="{next}">\n</form>')
-        return HTMLResponse(content=content)
+async def show_login(request: Request, error: str = None, success: str = None, next: str = None):
+    # 在表单中注入隐藏域（值经过 HTML 转义）
+    return _pages.render(request, "login.html", hidden_field("next", next) if next else "")
 
 @app.get("/register", response_class=HTMLResponse)
-async def show_register(error: str = None, success: str = None):
-    with open("All_html/register.html", "r", encoding="utf-8") as f:
-        content = f.read()
-        return HTMLResponse(content=content)
+async def show_register(request: Request, error: str = None, success: str = None):
+    return render_html("register.html", request)
 
 # --------------------------
 # favicon 避免 404
@@ -177,6 +313,118 @@ async def show_register(error: str = None, success: str = None):
 async def favicon():
     return Response(status_code=204)
 
+# --------------------------
+# 健康检查：模型加载并预热完成后才算就绪
+# --------------------------
+@app.get("/health/ready")
+async def health_ready():
+    status_code = 200 if await _model_ready(refresh=True) else 503
+    content = dict(_readiness)
+    if _model_client is None and status_code == 200:
+        # 热更新后版本会变化，每次都读取当前生效的模型信息
+        content['model'] = await _current_model_info()
+    return JSONResponse(status_code=status_code, content=content)
+
+async def _preprocess(contents):
+    image_tensor, key, timings = await _run_inference(inference.preprocess_with_key, contents)
+    _stages['decode'].observe(timings['decode'])
+    _stages['transform'].observe(timings['transform'])
+    return image_tensor, key
+
+async def _timed_infer(image_tensor):
+    start = time.perf_counter()
+    result = await _infer(image_tensor)
+    _stages['infer'].observe(time.perf_counter() - start)
+    return result
+
+async def _predict_bytes(contents):
+    """单张图片的完整推理路径：预测缓存 -> 推理执行器解码 -> 批处理器（或模型服务）前向传播"""
+    return await _prediction_cache.predict(contents, _preprocess, _timed_infer)
+
+async def _read_upload(chunks):
+    """分块读取上传内容（带字节上限与图片头部检查）
+
+    在准入控制之外进行：上传慢的客户端不占用推理名额，读取时间也不计入请求截止时间
+    """
+    return await read_limited(chunks, serve_config.max_upload_bytes, serve_config.max_image_pixels)
+
+# 预测缓存命中统计
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return _prediction_cache.stats()
+
+# 准入控制与推理队列统计（远程模式下队列在模型服务进程中）
+@app.get("/api/queue/stats")
+async def queue_stats():
+    stats = {"admission": _admission.stats()}
+    if _model_client is None:
+        stats["batcher"] = _batcher.stats()
+    return stats
+
+# 计数类指标直接读取各组件已有的统计，导出时才取值
+_metrics.callback('animal_admission_pending', '正在处理的预测请求数', 'gauge', lambda: _admission.pending)
+_metrics.callback('animal_admission_rejected_total', '因过载被拒绝的预测请求数', 'counter', lambda: _admission.rejected)
+_metrics.callback('animal_admission_timed_out_total', '超过截止时间的预测请求数', 'counter', lambda: _admission.timed_out)
+if _model_client is None:
+    _metrics.callback('animal_batch_queue_depth', '批处理队列中等待的请求数', 'gauge',
+                      lambda: _batcher.stats()['queue_depth'])
+    _metrics.callback('animal_batch_expired_total', '排队超时未计算的请求数', 'counter', lambda: _batcher.expired)
+_metrics.callback('animal_cache_hits_total', '预测缓存命中次数', 'counter', lambda: {
+    ('bytes',): _prediction_cache.bytes_tier.hits, ('tensor',): _prediction_cache.tensor_tier.hits,
+}, labelnames=('tier',))
+_metrics.callback('animal_cache_misses_total', '预测缓存未命中次数', 'counter', lambda: {
+    ('bytes',): _prediction_cache.bytes_tier.misses, ('tensor',): _prediction_cache.tensor_tier.misses,
+}, labelnames=('tier',))
+_metrics.callback('animal_page_cache_total', '页面请求数：hit 内存命中、reload 源文件变化后重新读取、not_modified 返回 304',
+                  'counter', lambda: {
+    ('hit',): _pages.hits, ('reload',): _pages.reloads, ('not_modified',): _pages.not_modified,
+}, labelnames=('result',))
+_metrics.callback('animal_asset_lookups_total', '静态资源查找数：hit 清单命中、negative_hit 缓存的 404、miss 访问磁盘',
+                  'counter', lambda: {
+    ('hit',): _assets.hits, ('negative_hit',): _assets.negative_hits, ('miss',): _assets.misses,
+}, labelnames=('result',))
+_metrics.callback('animal_image_cache_total', '响应式图片请求数：hit 磁盘缓存命中、generated 新生成、evicted 被淘汰',
+                  'counter', lambda: {
+    ('hit',): _images.hits, ('generated',): _images.generated, ('evicted',): _images.evicted,
+}, labelnames=('result',))
+_metrics.callback('animal_image_cache_bytes', '缩略图磁盘缓存占用字节数', 'gauge', lambda: _images.stats()['bytes'])
+_model_info_gauge = _metrics.gauge('animal_model_info', '当前生效的模型版本（值恒为 1）', labelnames=('version', 'backend'))
+# 首次加载（ensure_model_loaded）与热更新（reload_if_changed）都会记录 load_s，取当前生效版本的值
+_model_load_gauge = _metrics.gauge('animal_model_load_seconds', '当前生效模型的加载耗时（秒），热更新后为新版本的加载耗时',
+                                   labelnames=('version', 'backend'))
+# 级联推理的提前退出统计随模型信息一起在导出时更新
+_cascade_stats = {}
+if serve_config.cascade:
+    _metrics.callback('animal_cascade_requests_total', '经过级联小模型的图片数', 'counter',
+                      lambda: _cascade_stats.get('total', 0))
+    _metrics.callback('animal_cascade_early_exit_total', '由小模型直接给出结果的图片数', 'counter',
+                      lambda: _cascade_stats.get('early_exit', 0))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    try:
+        if _model_client is None:
+            info = await _current_model_info()
+        else:
+            # 批处理在模型服务进程中：批大小、排队时间与前向传播耗时从它的状态中取回
+            status = await _model_client.status()
+            info = status.get('model', {})
+            batches = status.get('batches', {})
+            if batches:
+                _batch_size.restore(batches['batch_size'])
+                _queue_wait.restore(batches['queue_wait'])
+                _stage_seconds.restore(batches['forward'], 'forward')
+    except (ConnectionError, RuntimeError, asyncio.TimeoutError):
+        info = {}
+    _model_info_gauge.clear()
+    _model_load_gauge.clear()
+    _cascade_stats.update(info.get('cascade', {}))
+    if info.get('version'):
+        _model_info_gauge.set(1, info['version'], serve_config.backend)
+        if 'load_s' in info:
+            _model_load_gauge.set(info['load_s'], info['version'], serve_config.backend)
+    return Response(content=_metrics.render(), media_type="text/plain; version=0.0.4")
+
 # --------------------------
 # 页面：动物识别（需登录）
 # --------------------------
@@ -185,41 +433,161 @@ async def identify_page(request: Request):
     user = get_current_user(request)
     if not user:
         return RedirectResponse(url="/login?error=请先登录后再访问动物识别功能&next=%2Fidentify", status_code=303)
-    return render_html("identify.html")
+    return render_html("identify.html", request)
 
 # --------------------------
 # 预测接口（需登录）
 # --------------------------
 from fastapi import UploadFile, File as UploadFileField
 
-@app.post("/api/predict")
-async def api_predict(request: Request, file: UploadFile = UploadFileField(...)):
+async def _predict_response(request: Request, chunks):
+    start = time.perf_counter()
+    response = await _handle_predict(request, chunks)
+    _request_seconds.labels(str(response.status_code)).observe(time.perf_counter() - start)
+    return response
+
+async def _handle_predict(request: Request, chunks):
     user = get_current_user(request)
     if not user:
         return JSONResponse(status_code=401, content={"detail": "未登录"})
-    if not _ensure_model_loaded():
+    if not await _model_ready():
         return JSONResponse(status_code=503, content={"detail": "模型未就绪或依赖未安装"})
 
     try:
-        contents = await file.read()
-        from PIL import Image as _Image
-        import torch as _torch
-        image = _Image.open(io.BytesIO(contents)).convert('RGB')
-        transformed_image = data_transforms['test'](image)
-        image_tensor = transformed_image.unsqueeze(0).to(device)
-        with _torch.no_grad():
-            outputs = _model(image_tensor)
-            probs = _torch.softmax(outputs, dim=1)
-            conf, preds = _torch.max(probs, 1)
-        pred_class = class_names[preds.item()]
-        confidence = float(round(conf.item() * 100, 2))
-        return {
+        start = time.perf_counter()
+        contents = await _read_upload(chunks)
+        _stages['read'].observe(time.perf_counter() - start)
+        pred_class, confidence, version = await _admission.run(_predict_bytes, contents)
+        start = time.perf_counter()
+        response = JSONResponse(content={
             "predicted_class": pred_class,
             "confidence": confidence,
+            "model_version": version,
             "message": "预测成功"
-        }
+        })
+        _stages['serialize'].observe(time.perf_counter() - start)
+        return response
+    except Exception as e:
+        return _inference_error_response(e, "预测过程出错")
+
+def _inference_error_response(error, action):
+    """推理路径异常 -> HTTP 响应：上传不合规 413/415，过载 429/503，其余 500"""
+    if isinstance(error, UploadRejected):
+        return JSONResponse(status_code=error.status_code, content={"detail": str(error)})
+    if isinstance(error, Overloaded):
+        return JSONResponse(
+            status_code=error.status_code,
+            content={"detail": str(error)},
+            headers={"Retry-After": str(error.retry_after)},
+        )
+    if isinstance(error, ConnectionError):
+        # 模型服务不可达：下次请求时重新探测
+        _readiness['ready'] = False
+        return JSONResponse(status_code=503, content={"detail": f"模型服务不可用: {str(error)}"})
+    return JSONResponse(status_code=500, content={"detail": f"{action}: {str(error)}"})
+
+@app.post("/api/predict")
+async def api_predict(request: Request, file: UploadFile = UploadFileField(...)):
+    return await _predict_response(request, iter_upload_file(file))
+
+# 原始字节上传：请求体直接是图片（Content-Type: application/octet-stream），跳过 multipart 解析
+@app.post("/api/predict/raw")
+async def api_predict_raw(request: Request):
+    return await _predict_response(request, request.stream())
+
+# --------------------------
+# 相似图片检索（需登录）：上传图片，返回训练集中特征最接近的 k 张图片
+# 索引由 embed_dataset.py 离线生成，特征提取与检索在推理执行器中按批进行；
+# 远程模型服务模式下交给模型服务进程，web worker 不加载特征提取器与索引
+# --------------------------
+_similar_batcher = InferenceBatcher(
+    inference.similar_batch,
+    max_batch_size=serve_config.max_batch_size,
+    max_wait_ms=serve_config.max_wait_ms,
+    executor=_executor,
+    max_queue=serve_config.max_queue_depth,
+    queue_timeout_ms=serve_config.request_timeout_s * 1000,
+)
+
+async def _search(contents, k):
+    image_tensor, _, _ = await _run_inference(inference.preprocess_with_key, contents)
+    if _model_client is not None:
+        return await _model_client.similar(image_tensor, k)
+    return await _similar_batcher.submit((image_tensor, k))
+
+@app.post("/api/similar")
+async def api_similar(request: Request, file: UploadFile = UploadFileField(...), k: int = 8):
+    user = get_current_user(request)
+    if not user:
+        return JSONResponse(status_code=401, content={"detail": "未登录"})
+    k = max(1, min(k, serve_config.similar_max_k))
+    start = time.perf_counter()
+    try:
+        contents = await _read_upload(iter_upload_file(file))
+        neighbors = await _admission.run(_search, contents, k)
+    except FileNotFoundError as e:
+        return JSONResponse(status_code=503, content={"detail": f"相似图片索引未生成: {str(e)}"})
+    except Exception as e:
+        return _inference_error_response(e, "检索过程出错")
+    for neighbor in neighbors:
+        neighbor["image_url"] = f"/api/similar/image/{neighbor['id']}"
+    return JSONResponse(content={
+        "neighbors": neighbors,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+    })
+
+@app.get("/api/similar/image/{item_id}")
+async def similar_image(request: Request, item_id: int):
+    user = get_current_user(request)
+    if not user:
+        return JSONResponse(status_code=401, content={"detail": "未登录"})
+    if not 0 <= item_id < 2 ** 32:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    try:
+        if _model_client is not None:
+            path = await _model_client.similar_image_path(item_id)
+        else:
+            path = await _run_inference(inference.similar_image_path, item_id)
+    except FileNotFoundError:
+        path = None
     except Exception as e:
-        return JSONResponse(status_code=500, content={"detail": f"预测过程出错: {str(e)}"})
+        return _inference_error_response(e, "读取图片出错")
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return FileResponse(path)
+
+# --------------------------
+# 批量预测接口（需登录）：多个文件或一个 zip 包，按 NDJSON 逐行流式返回
+# --------------------------
+async def _admitted_predict(contents):
+    """批量接口中的单张图片同样经过准入控制：占用名额、受截止时间约束，过载时对应行返回 error"""
+    return await _admission.run(_predict_bytes, contents)
+
+@app.post("/api/predict/batch")
+async def api_predict_batch(request: Request, files: List[UploadFile] = UploadFileField(...)):
+    user = get_current_user(request)
+    if not user:
+        return JSONResponse(status_code=401, content={"detail": "未登录"})
+    if not await _model_ready():
+        return JSONResponse(status_code=503, content={"detail": "模型未就绪或依赖未安装"})
+    try:
+        # 服务已满时整个请求直接 429，不开始流式响应
+        _admission.check()
+        # 压缩包目录在线程中读取，无法打开时返回 400
+        items = await asyncio.to_thread(iter_upload_items, files, serve_config.max_upload_bytes)
+    except zipfile.BadZipFile as e:
+        return JSONResponse(status_code=400, content={"detail": f"无法打开压缩包: {str(e)}"})
+    except Exception as e:
+        return _inference_error_response(e, "读取上传内容出错")
+    return StreamingResponse(
+        stream_predictions(
+            items,
+            _admitted_predict,
+            max_inflight=serve_config.batch_max_inflight,
+            max_member_bytes=serve_config.max_upload_bytes,
+        ),
+        media_type="application/x-ndjson",
+    )
 
 # --------------------------
 # API路由 - 登录验证
@@ -410,6 +778,22 @@ async def handle_register(
         error_msg = "注册失败"
         return RedirectResponse(url=f"/register?error={error_msg}", status_code=303)
 
+# --------------------------
+# 响应式图片：picture/ 中的图片按宽度档位缩小，按 Accept 选择 AVIF / WebP / JPEG，缩略图缓存在磁盘上
+# --------------------------
+@app.get("/img/{name}")
+async def responsive_image(request: Request, name: str, w: int = Query(None, ge=1, le=4096)):
+    fmt = negotiate_format(request.headers.get("accept"))
+    # 缩放与编码是 CPU 密集的阻塞操作，不占用事件循环；内容整体读出，发送期间缓存文件被淘汰也不受影响
+    result = await asyncio.to_thread(_images.read, name, w, fmt)
+    if result is None:
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
+    data, etag = result
+    headers = {"ETag": etag, "Vary": "Accept", "Cache-Control": serve_config.image_cache_control}
+    if not_modified(request.headers, etag, None):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=media_types[fmt], headers=headers)
+
 # --------------------------
 # 登出
 # --------------------------
@@ -434,14 +818,13 @@ async def api_me(request: Request):
 # 静态文件服务（放在最后，避免路由冲突）
 # --------------------------
 @app.get("/{filepath:path}")
-async def serve_static(filepath: str):
+async def serve_static(request: Request, filepath: str):
     """提供静态文件服务（CSS, JS, 图片等）"""
-    # 只允许特定文件类型
-    allowed_extensions = ['.html', '.css', '.js', '.jpg', '.jpeg', '.png', '.webp', '.gif', '.ico', '.svg', '.woff', '.woff2', '.ttf']
-    if any(filepath.endswith(ext) for ext in allowed_extensions):
-        if os.path.exists(filepath) and os.path.isfile(filepath):
-            return FileResponse(filepath)
-    
+    # 只允许特定文件类型（asset_manifest.asset_extensions），文件查找走静态资源清单，不存在的结果也会缓存
+    asset, immutable = _assets.lookup("/" + filepath)
+    if asset is not None:
+        return asset_response(asset, immutable, request.headers)
+
     # 如果不是静态文件，返回404
     return JSONResponse(status_code=404, content={"detail": "Not found"})
 
@@ -0,0 +1,198 @@
+import os
+import re
+import time
+import hashlib
+from collections import OrderedDict
+from compression import file_response, not_modified, precompressed_siblings, PrecompressedStaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.staticfiles import NotModifiedResponse
+
+# 静态资源清单：启动时扫描静态目录，建立 URL -> 文件（路径、stat、内容哈希、预压缩文件）的映射，
+# 请求时查表即可，不再逐请求 os.path.exists / os.stat
+# 每个根目录只扫描其中的文件（不递归），数据集、模型等子目录不会被索引，也不会经由静态路由发送
+# 指纹 URL：/static/css/home_style.css -> /static/css/home_style.3f9a1c2b.css，内容变化后 URL 随之变化，
+# 响应带 Cache-Control: immutable 与一年的 max-age，浏览器不再重新验证；页面加载时 rewrite_html 把资源引用换成指纹 URL
+# 清单中没有的 URL（页面引用但不存在的图片等）的 404 结果缓存 check_interval_s 秒，期间不访问磁盘
+# 文件是否修改由后台线程定期 scan()，变化经 apply() 在事件循环中写回清单并递增 version；请求路径上不做 stat
+
+# 可以作为静态资源发送的文件类型
+asset_extensions = ('.html', '.css', '.js', '.jpg', '.jpeg', '.png', '.webp', '.gif', '.ico', '.svg',
+                    '.woff', '.woff2', '.ttf')
+# 指纹 URL 的缓存策略
+immutable_cache_control = 'public, max-age=31536000, immutable'
+# 内容哈希取前 8 个十六进制字符
+digest_length = 8
+# 404 结果缓存的条数上限，防止随机 URL 占满内存
+max_missing = 4096
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()[:digest_length]
+
+
+class Asset:
+    __slots__ = ('url', 'path', 'stat', 'digest', 'siblings')
+
+    def __init__(self, url, path, stat_result, digest=None):
+        self.url = url
+        self.path = path
+        self.stat = stat_result
+        self.digest = digest or file_digest(path)
+        self.siblings = precompressed_siblings(path, stat_result)
+
+    @property
+    def fingerprinted_url(self):
+        stem, ext = os.path.splitext(self.url)
+        return f'{stem}.{self.digest}{ext}'
+
+
+class AssetManifest:
+    def __init__(self, roots, check_interval_s=5.0):
+        """roots: {URL 前缀: 目录}，如 {"/static/css/": "All_css", "/": "."}；前缀需以 / 结尾，目录不递归"""
+        self.roots = roots
+        self.check_interval_s = check_interval_s
+        self._assets = {}
+        self._fingerprinted = {}
+        self._missing = OrderedDict()
+        # 任一资源内容变化时递增，页面缓存据此重新改写引用了指纹 URL 的页面
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def build(self):
+        """启动时扫描全部根目录，返回文件数"""
+        for prefix, directory in self.roots.items():
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if name.endswith(asset_extensions) and not name.startswith('.') and os.path.isfile(path):
+                    self._add(Asset(prefix + name, path, os.stat(path)))
+        return len(self._assets)
+
+    def _add(self, asset):
+        previous = self._assets.get(asset.url)
+        if previous is not None:
+            self._fingerprinted.pop(previous.fingerprinted_url, None)
+            if previous.digest != asset.digest:
+                self.version += 1
+        self._assets[asset.url] = asset
+        self._fingerprinted[asset.fingerprinted_url] = asset
+
+    def _resolve(self, url):
+        """URL -> 清单外的文件路径（不访问磁盘）；不在任何根目录下、不是根目录中的文件或类型不允许时返回 None"""
+        if not url.endswith(asset_extensions) or '\\' in url or '\0' in url:
+            return None
+        for prefix, directory in sorted(self.roots.items(), key=lambda item: -len(item[0])):
+            if url.startswith(prefix):
+                name = url[len(prefix):]
+                if not name or '/' in name or name.startswith('.'):
+                    return None
+                return os.path.join(directory, name)
+        return None
+
+    def lookup(self, url):
+        """URL -> (Asset, 是否指纹 URL)；不存在时返回 (None, False)"""
+        asset = self._assets.get(url)
+        if asset is not None:
+            self.hits += 1
+            return asset, False
+        asset = self._fingerprinted.get(url)
+        if asset is not None:
+            self.hits += 1
+            return asset, True
+        now = time.monotonic()
+        missed_at = self._missing.get(url)
+        if missed_at is not None and now - missed_at < self.check_interval_s:
+            self.negative_hits += 1
+            return None, False
+        # 清单外的 URL：启动后新增的文件，检查一次磁盘
+        self.misses += 1
+        path = self._resolve(url)
+        if path is not None and os.path.isfile(path):
+            self._missing.pop(url, None)
+            asset = Asset(url, path, os.stat(path))
+            self._add(asset)
+            return asset, False
+        self._missing[url] = now
+        self._missing.move_to_end(url)
+        while len(self._missing) > max_missing:
+            self._missing.popitem(last=False)
+        return None, False
+
+    def scan(self):
+        """在后台线程中调用：stat 全部资源，返回有变化的 [(URL, 新的 Asset 或 None 表示已删除)]，不修改清单"""
+        changes = []
+        for asset in list(self._assets.values()):
+            try:
+                stat_result = os.stat(asset.path)
+            except OSError:
+                changes.append((asset.url, None))
+                continue
+            if (stat_result.st_mtime_ns, stat_result.st_size) != (asset.stat.st_mtime_ns, asset.stat.st_size):
+                changes.append((asset.url, Asset(asset.url, asset.path, stat_result)))
+            elif precompressed_siblings(asset.path, stat_result) != asset.siblings:
+                # 预压缩文件可能在启动后才由 compress_assets.py 生成
+                changes.append((asset.url, Asset(asset.url, asset.path, stat_result, asset.digest)))
+        return changes
+
+    def apply(self, changes):
+        """在事件循环中调用：把 scan() 的结果写回清单"""
+        for url, asset in changes:
+            if asset is not None:
+                self._add(asset)
+                continue
+            previous = self._assets.pop(url, None)
+            if previous is not None:
+                self._fingerprinted.pop(previous.fingerprinted_url, None)
+                self.version += 1
+
+    def url_for(self, url):
+        """清单中资源的指纹 URL；不在清单中时原样返回"""
+        asset = self._assets.get(url)
+        return asset.fingerprinted_url if asset is not None else url
+
+    def rewrite_html(self, body):
+        """页面中 href / src 引用的本站静态资源替换为指纹 URL"""
+        text = body.decode('utf-8')
+        text = _asset_reference.sub(lambda m: f'{m.group(1)}="{self.url_for(m.group(2))}"', text)
+        return text.encode('utf-8')
+
+    def stats(self):
+        return {'assets': len(self._assets), 'missing_cached': len(self._missing), 'hits': self.hits,
+                'misses': self.misses, 'negative_hits': self.negative_hits, 'version': self.version}
+
+
+_asset_reference = re.compile(r'\b(href|src)="(/[^"?#]+)"')
+
+
+def asset_response(asset, immutable, request_headers):
+    """发送清单中的资源：按 Accept-Encoding 选择预压缩文件，处理条件请求；指纹 URL 带 immutable 缓存策略"""
+    response = file_response(asset.path, asset.stat, request_headers, siblings=asset.siblings)
+    if immutable:
+        response.headers['Cache-Control'] = immutable_cache_control
+    sent_stat = asset.siblings.get(response.headers.get('content-encoding'), asset.stat)
+    if not_modified(request_headers, response.headers['etag'], sent_stat.st_mtime):
+        return NotModifiedResponse(response.headers)
+    return response
+
+
+class ManifestStaticFiles(PrecompressedStaticFiles):
+    """StaticFiles 挂载点：文件查找走静态资源清单（挂载在 prefix 下），支持指纹 URL"""
+
+    def __init__(self, *, directory, manifest, prefix, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.manifest = manifest
+        self.prefix = prefix
+
+    async def get_response(self, path, scope):
+        if scope['method'] not in ('GET', 'HEAD'):
+            raise HTTPException(status_code=405, headers={'Allow': 'GET, HEAD'})
+        asset, immutable = self.manifest.lookup(self.prefix + path.replace(os.sep, '/'))
+        if asset is None:
+            raise HTTPException(status_code=404)
+        return asset_response(asset, immutable, Headers(scope=scope))
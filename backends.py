@@ -0,0 +1,204 @@
+import os
+import importlib
+import threading
+
+# 推理后端：eager（原始 PyTorch 模型）、torchscript、compile（torch.export + torch.compile）、onnx（ONNX Runtime）
+# 导出前先把 BatchNorm 折叠进卷积并删除 Dropout，三种产物的计算图相同
+# 导出由 export_model.py 完成，服务端根据 serve_config.backend 选择加载哪一种
+# CPU 低精度模式：int8（静态量化）、dynamic（动态量化）由 quantize_model.py 导出；
+# bf16 直接加载原始权重，推理时 autocast 为 bfloat16
+# 任一后端都可以再包一层级联（CascadeClassifier）：小模型有把握的图片直接返回，其余交给该后端
+
+backend_names = ['eager', 'torchscript', 'compile', 'onnx', 'int8', 'dynamic', 'bf16']
+
+# 导出产物文件名（位于 serve_config.artifact_dir 目录下）
+artifact_names = {
+    'torchscript': 'cifar10_best.torchscript.pt',
+    'compile': 'cifar10_best.pt2',
+    'onnx': 'cifar10_best.onnx',
+    'int8': 'cifar10_best.int8.pt',
+    'dynamic': 'cifar10_best.dynamic.pt',
+}
+
+# 导出时支持的最大批大小（torch.export 的动态维度上限）
+max_export_batch_size = 64
+
+
+class MissingDependency(RuntimeError):
+    """后端所需的可选依赖（onnx / onnxruntime）未安装"""
+
+
+def _import_optional(name, backend):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise MissingDependency(f"{backend} 后端需要 {name}，当前未安装（pip install {name}）") from None
+
+
+def artifact_path(kind, artifact_dir):
+    return os.path.join(artifact_dir, artifact_names[kind])
+
+
+def prepare_for_serving(model):
+    """推理专用的计算图：BatchNorm 折叠进前一层卷积，Dropout 节点直接删除"""
+    from torch import nn
+    from torch.fx.experimental.optimization import fuse
+    model.eval()
+    graph_module = fuse(model)
+    graph = graph_module.graph
+    modules = dict(graph_module.named_modules())
+    for node in list(graph.nodes):
+        if node.op == 'call_module' and isinstance(modules[node.target], (nn.Dropout, nn.Identity)):
+            node.replace_all_uses_with(node.args[0])
+            graph.erase_node(node)
+    graph.lint()
+    graph_module.delete_all_unused_submodules()
+    graph_module.recompile()
+    return graph_module
+
+
+def export_torchscript(model, path, example):
+    import torch
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced.eval())
+    torch.jit.save(frozen, path)
+
+
+def export_compiled(model, path, example):
+    import torch
+    from torch.export import export, Dim
+    batch = Dim('batch', min=1, max=max_export_batch_size)
+    with torch.no_grad():
+        program = export(model, (example,), dynamic_shapes=({0: batch},))
+    torch.export.save(program, path)
+
+
+def export_onnx(model, path, example):
+    import torch
+    # torch.onnx.export 需要 onnx 包，提前检查以给出明确的错误信息
+    _import_optional('onnx', 'onnx')
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (example,), path,
+            input_names=['input'], output_names=['logits'],
+            dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=17, dynamo=False,
+        )
+
+
+exporters = {
+    'torchscript': export_torchscript,
+    'compile': export_compiled,
+    'onnx': export_onnx,
+}
+
+
+class OnnxClassifier:
+    """ONNX Runtime 会话的包装：输入输出都是 torch 张量，可直接替换 PyTorch 模型"""
+
+    def __init__(self, path, device):
+        ort = _import_optional('onnxruntime', 'onnx')
+        providers = ['CPUExecutionProvider']
+        if device.type == 'cuda' and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = ort.InferenceSession(path, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        import torch
+        logits = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(logits).to(batch.device)
+
+
+class Bf16Classifier:
+    """bfloat16 autocast 推理，输出转回 float32，与其他后端的接口一致"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, batch):
+        import torch
+        with torch.autocast(batch.device.type, dtype=torch.bfloat16):
+            return self.model(batch).float()
+
+
+class CascadeClassifier:
+    """级联推理：小模型先对整批图片给出结果，softmax 置信度低于阈值的样本再交给大模型
+
+    输出仍是 Nx10 logits（提前退出的行来自小模型），可直接替换任一后端
+    """
+
+    def __init__(self, small, large, threshold):
+        self.small = small
+        self.large = large
+        self.threshold = float(threshold)
+        self.early_exit = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        import torch
+        logits = self.small(batch)
+        confidence = torch.softmax(logits, dim=1).max(dim=1).values
+        uncertain = confidence < self.threshold
+        remaining = int(uncertain.sum())
+        with self._lock:
+            self.total += len(batch)
+            self.early_exit += len(batch) - remaining
+        if remaining == 0:
+            return logits
+        logits = logits.clone()
+        logits[uncertain] = self.large(batch[uncertain]).to(logits.dtype)
+        return logits
+
+    def stats(self):
+        with self._lock:
+            rate = self.early_exit / self.total if self.total else 0.0
+            return {'threshold': self.threshold, 'early_exit': self.early_exit, 'total': self.total,
+                    'early_exit_rate': round(rate, 4)}
+
+
+def load_cascade(large, path, device, threshold=None):
+    """加载级联第一级小模型（默认 model.TinyCNN）；threshold 为空时使用校准时写入检查点的阈值"""
+    import torch
+    from model import build_model
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"级联小模型不存在: {path}，请先运行 python train_cascade.py")
+    checkpoint = torch.load(path, map_location=device)
+    small = build_model(checkpoint.get('model_name', 'tiny_cnn'), checkpoint['state_dict']['fc.weight'].shape[0]).to(device)
+    small.load_state_dict(checkpoint['state_dict'])
+    if threshold is None:
+        if 'cascade_threshold' not in checkpoint:
+            raise ValueError(f"{path} 中没有校准阈值，请先运行 python train_cascade.py --skip-train")
+        threshold = checkpoint['cascade_threshold']
+    return CascadeClassifier(small.eval(), large, threshold)
+
+
+def load_backend(kind, artifact_dir, device, weights=None):
+    """加载指定后端，返回可调用的模型：输入 Nx3x32x32 张量，输出 Nx10 logits
+
+    eager / bf16 直接从 weights 加载训练权重，其余后端加载 artifact_dir 中的导出产物
+    """
+    import torch
+    if kind not in backend_names:
+        raise ValueError(f"未知的推理后端: {kind}（可选 {', '.join(backend_names)}）")
+    if kind in ('eager', 'bf16'):
+        from inference import load_classifier
+        model = load_classifier(weights, device)
+        return model if kind == 'eager' else Bf16Classifier(model)
+    path = artifact_path(kind, artifact_dir)
+    if not os.path.exists(path):
+        script = 'quantize_model.py' if kind in ('int8', 'dynamic') else 'export_model.py'
+        raise FileNotFoundError(f"推理后端产物不存在: {path}，请先运行 python {script}")
+    if kind in ('int8', 'dynamic'):
+        # 量化算子只有 CPU 实现
+        engines = torch.backends.quantized.supported_engines
+        torch.backends.quantized.engine = 'x86' if 'x86' in engines else 'qnnpack'
+        return torch.jit.load(path, map_location='cpu').eval()
+    if kind == 'torchscript':
+        return torch.jit.load(path, map_location=device).eval()
+    if kind == 'compile':
+        program = torch.export.load(path)
+        return torch.compile(program.module().to(device), dynamic=True)
+    return OnnxClassifier(path, device)
@@ -0,0 +1,146 @@
+import asyncio
+
+
+class InferenceBatcher:
+    """动态微批处理调度器
+
+    把并发到达的单张图片推理请求合并成一个批次，只做一次前向传播，
+    再把每一行结果分别交还给对应的请求。
+
+    infer_fn 接收一个样本列表，返回等长的结果列表（第 i 个结果对应第 i 个样本）。
+    传入 executor 时 infer_fn 在执行器中运行，不阻塞事件循环；
+    max_inflight 限制同时在执行器中计算的批次数，计算期间到达的请求继续排队凑成下一批。
+
+    max_queue 限制排队的请求数（0 表示不限），队列已满时 submit 立即抛出 asyncio.QueueFull；
+    排队超过 queue_timeout_ms 的请求在凑批时直接以 asyncio.TimeoutError 结束，不再占用计算。
+
+    observer(批大小, 各请求排队秒数列表, 计算秒数) 在每个批次完成后于事件循环中调用，用于记录指标。
+    """
+
+    def __init__(self, infer_fn, max_batch_size=16, max_wait_ms=5.0, executor=None, max_inflight=1,
+                 max_queue=0, queue_timeout_ms=None, observer=None):
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = None if not queue_timeout_ms else float(queue_timeout_ms) / 1000.0
+        self.observer = observer
+        self.rejected = 0
+        self.expired = 0
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._inflight = set()
+
+    def start(self):
+        """在当前事件循环中启动后台凑批任务（重复调用无副作用）"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(self.max_queue)
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，未完成的请求全部取消"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, item):
+        """提交单个样本，等待并返回它自己的推理结果；队列已满时抛出 asyncio.QueueFull"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((item, future, loop.time()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise asyncio.QueueFull(f"推理队列已满（{self.max_queue}）") from None
+        return await future
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "inflight_batches": len(self._inflight),
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+    async def _collect(self):
+        """阻塞等待第一个请求，然后在 max_wait 时间窗口内尽量凑满一个批次"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # 队列中已有的请求直接取走，不必等待
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # 先占用执行槽位再凑批：执行器忙时请求留在队列里，下一批自然变大
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            # 客户端已断开或排队超时的请求不再参与计算
+            if self.queue_timeout is not None:
+                oldest = loop.time() - self.queue_timeout
+                for _, future, enqueued in batch:
+                    if enqueued < oldest and not future.done():
+                        self.expired += 1
+                        future.set_exception(asyncio.TimeoutError("排队超时"))
+            started = loop.time()
+            waits = [started - enqueued for _, future, enqueued in batch if not future.done()]
+            batch = [(item, future) for item, future, _ in batch if not future.done()]
+            if not batch:
+                return
+            items = [item for item, _ in batch]
+            try:
+                if self.executor is None:
+                    results = self.infer_fn(items)
+                else:
+                    results = await loop.run_in_executor(self.executor, self.infer_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            if self.observer is not None:
+                self.observer(len(items), waits, loop.time() - started)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
@@ -0,0 +1,51 @@
+import os
+import argparse
+import torch
+import backends
+import serve_config
+from inference import load_classifier, weight_path
+from export_model import check_parity
+from benchmark_utils import median_latency
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 推理后端 CPU 基准测试：eager / torchscript / compile / onnx 在不同批大小下的延迟与吞吐量
+# 先运行 python export_model.py 导出产物
+# 用法: python benchmark_backends.py --threads 4 --repeat 50
+
+batch_sizes = [1, 2, 4, 8, 16, 32, 64]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='推理后端 CPU 基准测试')
+    parser.add_argument('--artifact-dir', default=serve_config.artifact_dir)
+    parser.add_argument('--backends', nargs='+', default=backends.backend_names, choices=backends.backend_names)
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads(), help='torch 线程数')
+    parser.add_argument('--repeat', type=int, default=30, help='每个批大小的计时次数')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    device = torch.device('cpu')
+    eager_model = load_classifier(weight_path, device)
+    print(f'torch {torch.__version__}, 线程数 {torch.get_num_threads()}')
+
+    header = f'{"backend":<12}{"max diff":>10}' + ''.join(f'{"bs=" + str(b):>16}' for b in batch_sizes)
+    print('\n每批中位延迟 ms / 吞吐量 img/s')
+    print(header)
+    print('-' * len(header))
+    for kind in args.backends:
+        if kind == 'eager':
+            model = eager_model
+        else:
+            try:
+                model = backends.load_backend(kind, args.artifact_dir, device, weight_path)
+            except (FileNotFoundError, backends.MissingDependency) as e:
+                print(f'{kind:<12}跳过: {e}')
+                continue
+        max_diff, _ = check_parity(eager_model, model, device)
+        cells = []
+        for batch_size in batch_sizes:
+            latency = median_latency(model, batch_size, args.repeat, warmup=5)
+            cells.append(f'{latency * 1000:.2f}/{batch_size / latency:.0f}')
+        print(f'{kind:<12}{max_diff:>10.1e}' + ''.join(f'{c:>16}' for c in cells))
@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+import argparse
+import torch
+from torch import nn
+from torchvision import models
+from batcher import InferenceBatcher
+import serve_config
+from benchmark_utils import percentile
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 动态微批处理基准测试
+# 对比 app.py 原有的逐请求 unsqueeze(0) 推理与 InferenceBatcher 合批推理的吞吐量和尾延迟
+# 用法: python benchmark_batching.py --concurrency 32 --requests 20
+
+device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+weight_path = 'cifar10_best.pt'
+num_classes = 10
+
+
+def build_model():
+    """与 app.py 相同的结构；不下载预训练权重，存在本地权重时加载"""
+    model = models.resnet18(weights=None)
+    model.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(model.fc.in_features, num_classes))
+    if os.path.exists(weight_path):
+        checkpoint = torch.load(weight_path, map_location=device)
+        model.load_state_dict(checkpoint['state_dict'])
+    return model.to(device).eval()
+
+
+async def run_clients(predict, concurrency, requests_per_client):
+    """concurrency 个客户端并发，每个客户端串行发送 requests_per_client 个请求"""
+    latencies = []
+
+    async def client():
+        for _ in range(requests_per_client):
+            image_tensor = torch.randn(3, 32, 32)
+            start = time.perf_counter()
+            await predict(image_tensor)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies
+
+
+async def benchmark(model, concurrency, requests_per_client, max_batch_size, max_wait_ms):
+    def forward(image_tensors):
+        with torch.no_grad():
+            probs = torch.softmax(model(torch.stack(image_tensors).to(device)), dim=1)
+            conf, preds = torch.max(probs, 1)
+        return list(zip(conf.tolist(), preds.tolist()))
+
+    # 原有路径：每个请求单独做一次 batch=1 的前向传播
+    async def predict_single(image_tensor):
+        return forward([image_tensor])[0]
+
+    batcher = InferenceBatcher(forward, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    # 预热，排除首次调用的初始化开销
+    forward([torch.randn(3, 32, 32)] * max_batch_size)
+
+    results = {}
+    for name, predict in [('single', predict_single), ('batched', batcher.submit)]:
+        throughput, latencies = await run_clients(predict, concurrency, requests_per_client)
+        results[name] = (throughput, latencies)
+    await batcher.stop()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='动态微批处理基准测试')
+    parser.add_argument('--concurrency', type=int, default=32, help='并发客户端数')
+    parser.add_argument('--requests', type=int, default=20, help='每个客户端的请求数')
+    parser.add_argument('--max-batch-size', type=int, default=serve_config.max_batch_size)
+    parser.add_argument('--max-wait-ms', type=float, default=serve_config.max_wait_ms)
+    args = parser.parse_args()
+
+    print(f'运行设备: {device}, torch 线程数: {torch.get_num_threads()}')
+    print(f'并发: {args.concurrency}, 每客户端请求: {args.requests}, '
+          f'max_batch_size: {args.max_batch_size}, max_wait_ms: {args.max_wait_ms}')
+
+    model = build_model()
+    results = asyncio.run(benchmark(
+        model, args.concurrency, args.requests, args.max_batch_size, args.max_wait_ms))
+
+    print(f'\n{"path":<10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}')
+    for name, (throughput, latencies) in results.items():
+        print(f'{name:<10}{throughput:>10.1f}'
+              f'{percentile(latencies, 50) * 1000:>10.1f}'
+              f'{percentile(latencies, 99) * 1000:>10.1f}')
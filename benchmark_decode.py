@@ -0,0 +1,84 @@
+import os
+import io
+import time
+import resource
+import argparse
+import multiprocessing
+from PIL import Image
+from image_decode import decode_for_model
+
+# 解码基准测试：原始路径（完整解码 + convert('RGB') + 缩放）与快速解码路径对比
+# 每次测量都在全新的子进程中进行，峰值内存取子进程 ru_maxrss 的增量
+# 用法: python benchmark_decode.py --dir picture --repeat 5
+
+target_size = 32
+
+
+def decode_full(contents):
+    """app.py 原有的解码方式"""
+    image = Image.open(io.BytesIO(contents)).convert('RGB')
+    return image.resize((target_size, target_size), Image.BILINEAR)
+
+
+def decode_fast(contents):
+    image = decode_for_model(contents, target=target_size)
+    return image.resize((target_size, target_size), Image.BILINEAR)
+
+
+decoders = {'full': decode_full, 'fast': decode_fast}
+
+
+def _measure(path, decoder_name, repeat, conn):
+    with open(path, 'rb') as f:
+        contents = f.read()
+    decoder = decoders[decoder_name]
+    # ru_maxrss 在 Linux 上以 KB 为单位
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decoder(contents)
+        timings.append(time.perf_counter() - start)
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((min(timings), (rss_peak - rss_before) / 1024))
+    conn.close()
+
+
+def measure(path, decoder_name, repeat):
+    ctx = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_measure, args=(path, decoder_name, repeat, child_conn))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='上传图片解码基准测试')
+    parser.add_argument('--dir', default='picture', help='样例图片目录')
+    parser.add_argument('--repeat', type=int, default=5, help='每张图片重复解码次数（取最快一次）')
+    args = parser.parse_args()
+
+    names = sorted(n for n in os.listdir(args.dir)
+                   if n.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')))
+    header = f'{"image":<14}{"size":>12}{"KB":>8}{"full ms":>10}{"fast ms":>10}{"full MB":>10}{"fast MB":>10}'
+    print(header)
+    print('-' * len(header))
+    totals = {'full': [0.0, 0.0], 'fast': [0.0, 0.0]}
+    for name in names:
+        path = os.path.join(args.dir, name)
+        with Image.open(path) as image:
+            size = f'{image.width}x{image.height}'
+        row = {}
+        for decoder_name in decoders:
+            seconds, peak_mb = measure(path, decoder_name, args.repeat)
+            row[decoder_name] = (seconds, peak_mb)
+            totals[decoder_name][0] += seconds
+            totals[decoder_name][1] = max(totals[decoder_name][1], peak_mb)
+        print(f'{name:<14}{size:>12}{os.path.getsize(path) // 1024:>8}'
+              f'{row["full"][0] * 1000:>10.1f}{row["fast"][0] * 1000:>10.1f}'
+              f'{row["full"][1]:>10.1f}{row["fast"][1]:>10.1f}')
+    print('-' * len(header))
+    print(f'{"total/max":<34}{totals["full"][0] * 1000:>10.1f}{totals["fast"][0] * 1000:>10.1f}'
+          f'{totals["full"][1]:>10.1f}{totals["fast"][1]:>10.1f}')
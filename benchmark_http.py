@@ -0,0 +1,314 @@
+import os
+import io
+import sys
+import json
+import time
+import socket
+import sqlite3
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import subprocess
+import httpx
+from benchmark_utils import percentile
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# app.py 的 HTTP 压测：页面路由、serve_static 静态文件、/api/login、/api/register、/api/predict
+# 默认在进程内通过 httpx.ASGITransport 直接调用 ASGI 应用（不经过网络，只测应用本身）；
+# --live 在子进程中启动 uvicorn，经本地 TCP 连接压测；--url 压测已经在运行的服务
+# 登录/注册使用 SQLite 文件代替 MySQL（--url 模式下使用该服务自己的数据库）
+# 每个场景报告吞吐量（请求/秒）与延迟分位数，--output 保存为 JSON，--compare 与之前的结果对比
+# 用法: python benchmark_http.py --concurrency 16 --requests 500 --output http_report.json
+#       python benchmark_http.py --live --scenarios pages predict --compare http_report.json
+
+page_paths = ['/', '/home', '/land', '/ocean', '/birds', '/protect', '/news', '/about', '/login', '/register']
+# 由 catch-all 路由 serve_static 提供的文件（不经过 /static 挂载）
+static_paths = ['/All_css/home_style.css', '/All_js/global_nav.js', '/All_js/home_interaction.js',
+                '/picture/bear.png', '/picture/lu.jpg']
+scenario_names = ['pages', 'static', 'login', 'register', 'predict']
+bench_user = ('benchuser', 'benchpass1')
+
+
+class SqliteCursor:
+    """pymysql DictCursor 的替身：%s 占位符换成 ?，fetchone 返回字典"""
+
+    def __init__(self, conn, latency_s):
+        self._cursor = conn.cursor()
+        self._latency_s = latency_s
+
+    def execute(self, sql, params=()):
+        if self._latency_s:
+            # 模拟数据库往返延迟；与 pymysql 一样阻塞调用线程
+            time.sleep(self._latency_s)
+        self._cursor.execute(sql.replace('%s', '?'), params)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    """pymysql 连接的本地替身，只实现 app.py 用到的方法"""
+
+    def __init__(self, path, latency_s=0.0):
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._latency_s = latency_s
+
+    def cursor(self):
+        return SqliteCursor(self._conn, self._latency_s)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def create_database(path):
+    """与 init_database.py 相同的 users 表，并写入压测用户"""
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE IF NOT EXISTS users ('
+                 'id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE, password TEXT NOT NULL)')
+    username, password = bench_user
+    conn.execute('INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)',
+                 (username, hashlib.sha256(password.encode('utf-8')).hexdigest()))
+    conn.commit()
+    conn.close()
+
+
+def patch_database(app_module, path, latency_ms):
+    create_database(path)
+    app_module.get_db_connection = lambda: SqliteConnection(path, latency_ms / 1000)
+
+
+def load_images(count):
+    """预测用的图片：优先取 course_data/test 中的图片，没有时生成随机噪声图片
+
+    图片池循环使用，超过池大小后的请求会命中预测缓存（SERVE_PREDICTION_CACHE_SIZE=0 可关闭缓存）
+    """
+    from config import data_root
+    paths = []
+    for folder, _, files in sorted(os.walk(os.path.join(data_root, 'test'))):
+        paths.extend(os.path.join(folder, name) for name in sorted(files))
+    if paths:
+        images = []
+        for path in paths[:count]:
+            with open(path, 'rb') as f:
+                images.append((os.path.basename(path), f.read()))
+        return images
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    images = []
+    for index in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(buffer, 'PNG')
+        images.append((f'noise_{index}.png', buffer.getvalue()))
+    return images
+
+
+def make_requests(images, run_id):
+    """场景名 -> 函数 (client, 第 i 个请求) -> 响应"""
+
+    async def pages(client, i):
+        return await client.get(page_paths[i % len(page_paths)])
+
+    async def static(client, i):
+        return await client.get(static_paths[i % len(static_paths)])
+
+    async def login(client, i):
+        return await client.post('/api/login', data={'username': bench_user[0], 'password': bench_user[1]})
+
+    async def register(client, i):
+        # 用户名需为 3-15 位字母或数字，每次运行使用不同的前缀避免重名
+        return await client.post('/api/register', data={'username': f'r{run_id}{i}', 'password': 'benchpass1'})
+
+    async def predict(client, i):
+        name, contents = images[i % len(images)]
+        return await client.post('/api/predict', files={'file': (name, contents, 'application/octet-stream')})
+
+    return {'pages': pages, 'static': static, 'login': login, 'register': register, 'predict': predict}
+
+
+async def run_scenario(client, request, total, concurrency, warmup):
+    """concurrency 个协程共享一个请求计数器，共发出 total 个请求；返回统计结果"""
+    for i in range(warmup):
+        await request(client, i)
+    latencies, statuses = [], {}
+    counter = iter(range(warmup, warmup + total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                status = (await request(client, i)).status_code
+            except httpx.HTTPError:
+                status = 'error'
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': sum(count for status, count in statuses.items() if status == 'error' or status >= 400),
+        'status': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'rps': total / elapsed,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+    }
+
+
+async def run_all(client, args, images):
+    requests = make_requests(images, args.run_id)
+    # 登录一次，后续预测请求带上会话 Cookie
+    response = await requests['login'](client, 0)
+    if response.status_code != 200:
+        await client.post('/api/register', data={'username': bench_user[0], 'password': bench_user[1]})
+        response = await requests['login'](client, 0)
+    if response.status_code != 200:
+        print(f'压测用户登录失败（{response.status_code}），login / predict 场景将返回错误')
+    results = {}
+    for name in args.scenarios:
+        results[name] = await run_scenario(client, requests[name], args.requests, args.concurrency, args.warmup)
+        print_row(name, results[name])
+    return results
+
+
+def print_row(name, row):
+    status = ' '.join(f'{code}:{count}' for code, count in row['status'].items())
+    print(f'{name:<10}{row["rps"]:>10.1f}{row["mean_ms"]:>10.2f}{row["p50_ms"]:>10.2f}'
+          f'{row["p90_ms"]:>10.2f}{row["p99_ms"]:>10.2f}{row["max_ms"]:>10.2f}  {status}')
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f'\n与 {baseline_path}（{baseline.get("commit", "?")}）对比')
+    print(f'{"scenario":<10}{"rps":>18}{"p99 ms":>20}')
+    for name, row in results.items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            continue
+        print(f'{name:<10}{old["rps"]:>8.1f} -> {row["rps"]:<8.1f}'
+              f'{old["p99_ms"]:>9.2f} -> {row["p99_ms"]:<9.2f}({(row["rps"] / old["rps"] - 1) * 100:+.1f}% rps)')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(port, db_path, db_latency_ms):
+    """--live 的子进程：替换数据库连接后在前台运行 uvicorn"""
+    import uvicorn
+    import app as app_module
+    patch_database(app_module, db_path, db_latency_ms)
+    uvicorn.run(app_module.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+async def wait_until_up(base_url, timeout_s=120):
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get('/favicon.ico')
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise TimeoutError(f'{base_url} 在 {timeout_s}s 内没有启动')
+
+
+async def main(args):
+    images = load_images(args.images) if 'predict' in args.scenarios else []
+    print(f'模式 {args.mode}，并发 {args.concurrency}，每个场景 {args.requests} 个请求')
+    print(f'{"scenario":<10}{"rps":>10}{"mean ms":>10}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}  status')
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.mode == 'asgi':
+        import app as app_module
+        patch_database(app_module, args.db, args.db_latency_ms)
+        transport = httpx.ASGITransport(app=app_module.app)
+        # ASGITransport 不会触发 lifespan，手动执行启动/关闭（模型加载与预热、批处理器）
+        async with app_module.app.router.lifespan_context(app_module.app):
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+                return await run_all(client, args, images)
+    server = None
+    base_url = args.url
+    if args.mode == 'live':
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        server = subprocess.Popen([sys.executable, __file__, '--serve-port', str(port), '--db', args.db,
+                                   '--db-latency-ms', str(args.db_latency_ms)])
+    try:
+        await wait_until_up(base_url)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            return await run_all(client, args, images)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='app.py HTTP 压测')
+    parser.add_argument('--scenarios', nargs='+', default=scenario_names, choices=scenario_names)
+    parser.add_argument('--concurrency', type=int, default=16, help='同时在途的请求数')
+    parser.add_argument('--requests', type=int, default=500, help='每个场景的请求数')
+    parser.add_argument('--warmup', type=int, default=10, help='每个场景正式计时前的请求数')
+    parser.add_argument('--images', type=int, default=256, help='预测场景的图片池大小')
+    parser.add_argument('--live', action='store_true', help='在子进程中启动 uvicorn，经 TCP 压测')
+    parser.add_argument('--url', default=None, help='压测已经运行的服务，如 http://127.0.0.1:8000')
+    parser.add_argument('--db', default=None, help='SQLite 替身数据库文件（默认临时文件）')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help='每条 SQL 附加的模拟延迟')
+    parser.add_argument('--output', default=None, help='结果保存为 JSON')
+    parser.add_argument('--compare', default=None, help='与之前保存的 JSON 结果对比')
+    parser.add_argument('--serve-port', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_port is not None:
+        serve(args.serve_port, args.db, args.db_latency_ms)
+        sys.exit(0)
+
+    args.mode = 'url' if args.url else 'live' if args.live else 'asgi'
+    args.run_id = int(time.time()) % 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        args.db = args.db or os.path.join(tmp, 'users.sqlite3')
+        results = asyncio.run(main(args))
+
+    report = {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'mode': args.mode,
+        'concurrency': args.concurrency,
+        'scenarios': results,
+    }
+    if args.compare:
+        print_comparison(results, args.compare)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'结果已保存: {args.output}')
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import platform
+import argparse
+import torch
+import inference
+from model import model_registry
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 推理路径微基准：从预处理后的输入到 softmax 输出，不含 HTTP、解码与批处理排队
+# 扫描批大小 x torch.set_num_threads x 输入管线：
+#   tensor  输入已是归一化后的 Nx3x32x32 张量，只计 stack + 前向传播 + softmax
+#   pil     输入是解码后的 PIL 图片，另计 inference 中服务端同款 transform（Resize/ToTensor/Normalize）
+# 模型与 app.py / picture_test.py 中 initialize_model 构建的 ResNet18（Dropout + Linear 分类头）结构相同，
+# 存在权重文件时加载，否则使用固定随机种子初始化的权重（延迟与权重取值无关）
+# 输入和权重都由固定种子生成；结果 JSON 同时记录 CPU 型号、可用核数与 torch 并行配置，便于在不同机器间对照
+# 用法: python benchmark_inference.py --output inference_baseline.json
+#       taskset -c 0-3 python benchmark_inference.py --threads 1 2 4 --compare inference_baseline.json
+
+batch_sizes = [1, 2, 4, 8, 16, 32, 64]
+pipelines = ['tensor', 'pil']
+
+
+def default_threads():
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    return sorted({n for n in (1, 2, 4, 8, cores) if n <= cores})
+
+
+def cpu_model():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def environment():
+    return {
+        'cpu': cpu_model(),
+        'available_cores': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'mkldnn': torch.backends.mkldnn.is_available(),
+        'omp_num_threads': os.environ.get('OMP_NUM_THREADS'),
+        'interop_threads': torch.get_num_interop_threads(),
+    }
+
+
+def load_model(model_name, weights):
+    device = torch.device('cpu')
+    if weights and os.path.exists(weights):
+        return inference.load_classifier(weights, device), weights
+    torch.manual_seed(0)
+    return inference.build_classifier(len(inference.class_names), device, model_name).eval(), None
+
+
+def make_inputs(pipeline, batch_size, seed=0):
+    """固定种子生成的一批输入：张量列表或 32x32 PIL 图片列表"""
+    generator = torch.Generator().manual_seed(seed)
+    if pipeline == 'tensor':
+        return [torch.randn(3, 32, 32, generator=generator) for _ in range(batch_size)]
+    from PIL import Image
+    pixels = torch.randint(0, 256, (batch_size, 32, 32, 3), dtype=torch.uint8, generator=generator)
+    return [Image.fromarray(p.numpy()) for p in pixels]
+
+
+def run_once(model, pipeline, inputs):
+    """与 inference.predict_batch 相同的计算：（transform）-> stack -> 前向传播 -> softmax -> top-1"""
+    with torch.no_grad():
+        if pipeline == 'pil':
+            inputs = [inference.data_transforms['test'](image) for image in inputs]
+        probs = torch.softmax(model(torch.stack(inputs)), dim=1)
+        return torch.max(probs, 1)
+
+
+def measure(model, pipeline, batch_size, repeat, warmup):
+    inputs = make_inputs(pipeline, batch_size)
+    for _ in range(warmup):
+        run_once(model, pipeline, inputs)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_once(model, pipeline, inputs)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    return {
+        'pipeline': pipeline,
+        'batch_size': batch_size,
+        'median_ms': median * 1000,
+        'p90_ms': timings[min(len(timings) - 1, int(0.9 * len(timings)))] * 1000,
+        'img_per_s': batch_size / median,
+    }
+
+
+def print_table(results, pipeline, threads, sizes):
+    print(f'\n[{pipeline}] 每批中位延迟 ms / 吞吐量 img/s')
+    header = f'{"threads":<9}' + ''.join(f'{"bs=" + str(b):>16}' for b in sizes)
+    print(header)
+    print('-' * len(header))
+    for n in threads:
+        cells = {r['batch_size']: f'{r["median_ms"]:.2f}/{r["img_per_s"]:.0f}'
+                 for r in results if r['pipeline'] == pipeline and r['threads'] == n}
+        print(f'{n:<9}' + ''.join(f'{cells.get(b, "-"):>16}' for b in sizes))
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r['pipeline'], r['threads'], r['batch_size']): r for r in baseline['results']}
+    print(f'\n与 {baseline_path}（{baseline["environment"]["cpu"]}）对比吞吐量')
+    for r in results:
+        previous = old.get((r['pipeline'], r['threads'], r['batch_size']))
+        if previous is not None:
+            change = (r['img_per_s'] / previous['img_per_s'] - 1) * 100
+            print(f'{r["pipeline"]:<8}threads={r["threads"]:<4}bs={r["batch_size"]:<4}'
+                  f'{previous["img_per_s"]:>10.0f} -> {r["img_per_s"]:<10.0f}{change:+.1f}%')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='推理路径微基准（批大小 x 线程数 x 输入管线）')
+    parser.add_argument('--model', default='resnet18', choices=list(model_registry), help='无权重文件时构建的结构')
+    parser.add_argument('--weights', default=inference.weight_path, help='存在时加载（结构以检查点为准）')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=batch_sizes)
+    parser.add_argument('--threads', type=int, nargs='+', default=default_threads())
+    parser.add_argument('--pipelines', nargs='+', default=pipelines, choices=pipelines)
+    parser.add_argument('--repeat', type=int, default=30, help='每个配置的计时次数')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--output', default=None, help='结果保存为 JSON 基线')
+    parser.add_argument('--compare', default=None, help='与之前保存的基线对比')
+    args = parser.parse_args()
+
+    inference._ensure_transforms()
+    model, loaded = load_model(args.model, args.weights)
+    env = environment()
+    print(f'{env["cpu"]}，可用核数 {env["available_cores"]}，torch {env["torch"]}，'
+          f'权重 {loaded or "随机初始化（" + args.model + "）"}')
+
+    results = []
+    for n in args.threads:
+        torch.set_num_threads(n)
+        for pipeline in args.pipelines:
+            for batch_size in args.batch_sizes:
+                results.append(dict(measure(model, pipeline, batch_size, args.repeat, args.warmup), threads=n))
+    for pipeline in args.pipelines:
+        print_table(results, pipeline, args.threads, args.batch_sizes)
+
+    if args.compare:
+        print_comparison(results, args.compare)
+    if args.output:
+        report = {'environment': env, 'model': args.model, 'weights': loaded,
+                  'repeat': args.repeat, 'results': results}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'基线已保存: {args.output}')
@@ -0,0 +1,108 @@
+import os
+import json
+import argparse
+import torch
+from torch import nn, optim
+from torch.utils.flop_counter import FlopCounterMode
+import serve_config
+from config import seed, set_seed, learning_rate_phase1
+from model import model_registry, build_model, initialize_model
+from inference import load_classifier, weight_path
+from quantize_model import evaluation_loader
+from benchmark_utils import evaluate, median_latency
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 模型结构对比：model.model_registry 中各网络的参数量、计算量（32x32 输入）、CPU 吞吐量与测试集准确率
+# 每个模型的权重为 cifar10_<名称>.pt（resnet18 为 cifar10_best.pt），不存在时准确率留空；
+# --train-epochs 指定时先用 train.train_model 训练缺少权重的模型
+# 用法: python benchmark_models.py --threads 4 --output models_report.json
+#       python benchmark_models.py --models resnet20 mobilenet_v3_small --train-epochs 30
+# 服务端切换模型: SERVE_WEIGHTS=cifar10_resnet20.pt uvicorn app:app（结构由检查点中的 model_name 决定）
+
+# 吞吐量按服务端的最大批大小计时
+throughput_batch_size = serve_config.max_batch_size
+
+
+def checkpoint_path(model_name):
+    return weight_path if model_name == 'resnet18' else f'cifar10_{model_name}.pt'
+
+
+def count_flops(model):
+    """单张 32x32 图片前向传播的浮点运算次数（乘加各算一次）"""
+    counter = FlopCounterMode(display=False)
+    with torch.no_grad(), counter:
+        model(torch.randn(1, 3, 32, 32))
+    return counter.get_total_flops()
+
+
+def train(model_name, epochs, path):
+    """resnet18 沿用迁移学习（只训练分类层），其余从头训练：SGD + momentum，验证损失不降时减半学习率"""
+    from data_loader import load_datasets
+    from train import train_model
+    set_seed(seed)
+    dataloaders, dataset_sizes, class_names = load_datasets()
+    model = initialize_model(model_name, len(class_names))
+    if model_name == 'resnet18':
+        optimizer = optim.Adam([p for p in model.parameters() if p.requires_grad], lr=learning_rate_phase1)
+    else:
+        optimizer = optim.SGD(model.parameters(), lr=0.05, momentum=0.9, weight_decay=5e-4, nesterov=True)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=3)
+    train_model(model, dataloaders, dataset_sizes, nn.CrossEntropyLoss(), optimizer, scheduler,
+                num_epochs=epochs, save_path=path, model_name=model_name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='模型结构的计算量 / 吞吐量 / 准确率对比')
+    parser.add_argument('--models', nargs='+', default=list(model_registry), choices=list(model_registry))
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads(), help='torch 线程数')
+    parser.add_argument('--repeat', type=int, default=20, help='延迟计时次数')
+    parser.add_argument('--limit', type=int, default=None, help='只评估测试集中的部分图片')
+    parser.add_argument('--train-epochs', type=int, default=0, help='大于 0 时先训练缺少权重的模型')
+    parser.add_argument('--output', default=None, help='报告保存为 JSON')
+    args = parser.parse_args()
+
+    for name in args.models:
+        path = checkpoint_path(name)
+        if args.train_epochs > 0 and not os.path.exists(path):
+            print(f'训练 {name} -> {path}')
+            train(name, args.train_epochs, path)
+
+    torch.set_num_threads(args.threads)
+    cpu = torch.device('cpu')
+    loader = evaluation_loader(limit=args.limit) if os.path.isdir(os.path.join('course_data', 'test')) else None
+    print(f'torch {torch.__version__}, 线程数 {torch.get_num_threads()}, 吞吐量批大小 {throughput_batch_size}')
+
+    report = {}
+    header = (f'{"model":<20}{"params M":>10}{"MFLOPs":>10}{"bs=1 ms":>10}'
+              f'{"img/s":>10}{"vs resnet18":>13}{"accuracy":>10}')
+    print(header)
+    print('-' * len(header))
+    for name in args.models:
+        path = checkpoint_path(name)
+        # 有权重时加载训练好的模型（检查点中的 model_name 必须与名称一致），否则只测结构
+        if loader is not None and os.path.exists(path):
+            model = load_classifier(path, cpu)
+            accuracy = evaluate(model, loader)
+        else:
+            model = build_model(name, 10).eval()
+            accuracy = None
+        batch_latency = median_latency(model, throughput_batch_size, args.repeat)
+        report[name] = {
+            'params': sum(p.numel() for p in model.parameters()),
+            'flops': count_flops(model),
+            'latency_ms_bs1': median_latency(model, 1, args.repeat) * 1000,
+            'throughput': throughput_batch_size / batch_latency,
+            'accuracy': accuracy,
+        }
+        row = report[name]
+        baseline = report.get('resnet18', row)['throughput']
+        print(f'{name:<20}{row["params"] / 1e6:>10.2f}{row["flops"] / 1e6:>10.1f}{row["latency_ms_bs1"]:>10.2f}'
+              f'{row["throughput"]:>10.0f}{row["throughput"] / baseline:>12.2f}x'
+              + (f'{accuracy:>10.4f}' if accuracy is not None else f'{"-":>10}'))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'报告已保存: {args.output}')
@@ -0,0 +1,63 @@
+import os
+import json
+import argparse
+import torch
+import backends
+import serve_config
+from inference import weight_path
+from quantize_model import evaluation_loader
+from benchmark_utils import evaluate, median_latency
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# CPU 推理模式的精度-延迟对比报告：eager（FP32）/ bf16 / dynamic / int8
+# 精度在 course_data/test 上评估（校准用的图片也在其中，--limit 可缩小评估范围）
+# 先运行 python quantize_model.py 导出量化模型
+# 用法: python benchmark_quantization.py --threads 4 --output quantization_report.json
+
+modes = ['eager', 'bf16', 'dynamic', 'int8']
+latency_batch_sizes = [1, 64]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CPU 推理模式精度-延迟对比')
+    parser.add_argument('--artifact-dir', default=serve_config.artifact_dir)
+    parser.add_argument('--limit', type=int, default=None, help='只评估测试集中的部分图片')
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads(), help='torch 线程数')
+    parser.add_argument('--repeat', type=int, default=20, help='延迟计时次数')
+    parser.add_argument('--output', default=None, help='报告保存为 JSON')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    device = torch.device('cpu')
+    loader = evaluation_loader(args.limit)
+    print(f'torch {torch.__version__}, 线程数 {torch.get_num_threads()}, 评估图片 {len(loader.dataset)} 张')
+
+    report = {}
+    header = f'{"mode":<10}{"accuracy":>10}' + ''.join(f'{"bs=" + str(b) + " ms":>12}' for b in latency_batch_sizes) \
+        + f'{"bs=64 img/s":>14}{"speedup":>10}'
+    print(header)
+    print('-' * len(header))
+    for mode in modes:
+        try:
+            model = backends.load_backend(mode, args.artifact_dir, device, weight_path)
+        except (FileNotFoundError, RuntimeError) as e:
+            print(f'{mode:<10}跳过: {e}')
+            continue
+        accuracy = evaluate(model, loader)
+        latencies = {b: median_latency(model, b, args.repeat) for b in latency_batch_sizes}
+        report[mode] = {
+            'accuracy': accuracy,
+            'latency_ms': {str(b): latencies[b] * 1000 for b in latency_batch_sizes},
+            'throughput': latency_batch_sizes[-1] / latencies[latency_batch_sizes[-1]],
+        }
+        baseline = report.get('eager', report[mode])['throughput']
+        print(f'{mode:<10}{accuracy:>10.4f}'
+              + ''.join(f'{latencies[b] * 1000:>12.2f}' for b in latency_batch_sizes)
+              + f'{report[mode]["throughput"]:>14.0f}{report[mode]["throughput"] / baseline:>9.2f}x')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'报告已保存: {args.output}')
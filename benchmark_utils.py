@@ -0,0 +1,41 @@
+import time
+
+# 基准测试脚本共用的计时与评估函数
+# torch 在函数内导入：benchmark_http.py 只用 percentile，不需要安装 torch
+
+
+def evaluate(model, loader):
+    """模型在 loader 上的 top-1 准确率"""
+    import torch
+    correct = 0
+    total = 0
+    with torch.no_grad():
+        for inputs, labels in loader:
+            preds = model(inputs).argmax(1)
+            correct += (preds == labels).sum().item()
+            total += labels.size(0)
+    return correct / total
+
+
+def median_latency(model, batch_size, repeat, warmup=3):
+    """随机输入下单个批次的中位延迟（秒）"""
+    import torch
+    inputs = torch.randn(batch_size, 3, 32, 32)
+    timings = []
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(inputs)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model(inputs)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def percentile(values, q):
+    """values 的第 q 百分位数（取最近的样本值）；空列表返回 0"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
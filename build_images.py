@@ -0,0 +1,99 @@
+import os
+import re
+import argparse
+import serve_config
+import image_variants
+
+# 构建步骤：为 picture/ 中的图片预先生成全部宽度档位 x 格式的缩略图（写入 SERVE_IMAGE_CACHE_DIR），
+# 服务启动后 /img 请求直接命中磁盘缓存；同时生成页面改写用的尺寸与模糊占位图（manifest.json）
+# 最后报告每次页面访问的图片字节数：改写前页面引用的原图 vs 改写后浏览器按 srcset 实际下载的缩略图
+# 报告假设页面中的全部图片都被加载（loading="lazy" 时首屏以外的图片要滚动到才下载，实际更少）
+# 用法: python build_images.py [--pages home.html land.html ocean.html]
+
+default_pages = ['home.html', 'land.html', 'ocean.html', 'birds.html']
+# 报告使用的设备：(名称, 视口宽度 CSS 像素, 设备像素比)
+devices = [('desktop', 1280, 1), ('mobile', 390, 3)]
+
+_original_img = re.compile(r'<img\s+src="/(?:picture|static/images)/([^"/]+)"')
+_original_background = re.compile(r'url\((["\']?)/(?:picture|static/images)/([^"\')/]+)\1\)')
+_sizes_entry = re.compile(r'\(max-width:\s*(\d+)px\)\s*(\d+)vw')
+
+
+def slot_width(viewport):
+    """按 image_variants.default_sizes 计算 <img> 在该视口下的显示宽度（CSS 像素）"""
+    *conditions, fallback = [part.strip() for part in image_variants.default_sizes.split(',')]
+    for condition in conditions:
+        max_width, vw = map(int, _sizes_entry.match(condition).groups())
+        if viewport <= max_width:
+            return viewport * vw / 100
+    return viewport * int(fallback.removesuffix('vw')) / 100
+
+
+def build_all(cache):
+    """全部图片 x 宽度档位 x 格式，返回 [(图片, 原图字节, {格式: 800w 字节})]"""
+    rows = []
+    for name in sorted(os.listdir(cache.source_dir)):
+        if cache.source_path(name) is None:
+            continue
+        info = cache.info(name)
+        widths = sorted({image_variants.snap_width(w, info['width']) for w in image_variants.variant_widths})
+        sizes = {}
+        for fmt in image_variants.variant_formats:
+            for width in widths:
+                path = cache.get(name, width, fmt)
+                if width == image_variants.snap_width(image_variants.variant_widths[2], info['width']):
+                    sizes[fmt] = os.path.getsize(path)
+        rows.append((name, os.path.getsize(cache.source_path(name)), sizes))
+    return rows
+
+
+def page_bytes(cache, html, device, fmt):
+    """页面引用的（存在的）图片数与字节数：device 为 None 时是改写前的原图，否则是该设备下浏览器选中的缩略图"""
+    total = count = 0
+    images = [(m.group(1), None) for m in _original_img.finditer(html)] + \
+             [(m.group(2), image_variants.background_width) for m in _original_background.finditer(html)]
+    for name, width in images:
+        path = cache.source_path(name)
+        if path is None:
+            continue
+        count += 1
+        if device is None:
+            total += os.path.getsize(path)
+            continue
+        if width is None:
+            # 浏览器选择不小于 显示宽度 x 设备像素比 的最小候选
+            _, viewport, dpr = device
+            width = slot_width(viewport) * dpr
+        total += os.path.getsize(cache.get(name, width, fmt))
+    return total, count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='预生成响应式图片缩略图并报告页面图片字节数')
+    parser.add_argument('--cache-dir', default=serve_config.image_cache_dir)
+    parser.add_argument('--pages', nargs='+', default=default_pages)
+    args = parser.parse_args()
+
+    cache = image_variants.DerivativeCache('picture', args.cache_dir, serve_config.image_cache_max_bytes)
+    print(f'{"image":<20}{"original":>12}' + ''.join(f'{fmt + "@800w":>12}' for fmt in image_variants.variant_formats))
+    for name, original, sizes in build_all(cache):
+        print(f'{name:<20}{original:>12}' + ''.join(f'{sizes[fmt]:>12}' for fmt in image_variants.variant_formats))
+    stats = cache.stats()
+    print(f'缓存: {stats["files"]} 个文件，{stats["bytes"] / 1024:.0f} KiB -> {args.cache_dir}')
+
+    columns = [(device, fmt) for device in devices for fmt in ('avif', 'webp')]
+    print(f'\n每次页面访问的图片字节数（KiB）')
+    print(f'{"page":<14}{"images":>8}{"original":>12}' + ''.join(f'{d[0] + "/" + fmt:>16}' for d, fmt in columns)
+          + f'{"html +bytes":>14}')
+    for page in args.pages:
+        with open(os.path.join('All_html', page), 'rb') as f:
+            body = f.read()
+        html = body.decode('utf-8')
+        original, count = page_bytes(cache, html, None, None)
+        if count == 0:
+            print(f'{page:<14}{0:>8}{"-":>12}  （页面不引用图片）')
+            continue
+        cells = ''.join(f'{page_bytes(cache, html, device, fmt)[0] / 1024:>16.0f}' for device, fmt in columns)
+        # 内联占位图与 srcset 让页面变大，页面本身经过 gzip 压缩
+        growth = len(image_variants.rewrite_html(body, cache)) - len(body)
+        print(f'{page:<14}{count:>8}{original / 1024:>12.0f}{cells}{growth:>14}')
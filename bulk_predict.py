@@ -0,0 +1,112 @@
+import json
+import asyncio
+import zipfile
+
+# 批量识别：多文件或单个 zip 压缩包，逐张图片以 NDJSON 行的形式流式返回结果
+# 同时在途的图片数量有上限，内存占用与压缩包大小无关
+
+
+def iter_upload_items(files, max_member_bytes):
+    """把上传内容展开为 (文件名, 读取函数) 序列；单个 zip 文件按成员逐个展开，不整体解压
+
+    zip 目录在这里立即读取：压缩包无法打开时直接抛出 zipfile.BadZipFile，调用方可在开始流式响应前返回 400
+    """
+    if len(files) == 1 and _is_zip(files[0]):
+        return _iter_archive(zipfile.ZipFile(files[0].file), max_member_bytes)
+    return _iter_files(files, max_member_bytes)
+
+
+def _iter_archive(archive, max_member_bytes):
+    for info in archive.infolist():
+        if info.is_dir() or info.filename.startswith('__MACOSX/'):
+            continue
+        if info.file_size > max_member_bytes:
+            yield info.filename, _raise(ValueError(f"文件过大（{info.file_size} 字节）"))
+            continue
+        yield info.filename, (lambda info=info: archive.read(info))
+
+
+def _iter_files(files, max_member_bytes):
+    for upload in files:
+        yield upload.filename, (lambda upload=upload: upload.file.read(max_member_bytes + 1))
+
+
+def _is_zip(upload):
+    if (upload.filename or '').lower().endswith('.zip'):
+        return True
+    is_zip = zipfile.is_zipfile(upload.file)
+    upload.file.seek(0)
+    return is_zip
+
+
+def _raise(error):
+    def reader():
+        raise error
+    return reader
+
+
+def _line(payload):
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+async def stream_predictions(items, predict, max_inflight=64, max_member_bytes=None):
+    """并发识别 items 中的图片，哪张先完成就先输出哪张的结果行
+
+    predict(图片字节) 是返回 (类别, 置信度, 模型版本) 的协程函数；并发调用会被推理批处理器合并为批次。
+    最多 max_inflight 张图片同时在读取/解码/推理或等待输出，客户端读得慢时上游自动暂停。
+    """
+    slots = asyncio.Semaphore(max_inflight)
+    results = asyncio.Queue()
+    tasks = set()
+
+    async def classify(index, name, read):
+        try:
+            # zip 解压与文件读取是阻塞 I/O，放到线程中执行
+            contents = await asyncio.to_thread(read)
+            if max_member_bytes is not None and len(contents) > max_member_bytes:
+                raise ValueError(f"文件过大（超过 {max_member_bytes} 字节）")
+            pred_class, confidence, version = await predict(contents)
+            payload = {"index": index, "filename": name,
+                       "predicted_class": pred_class, "confidence": confidence, "model_version": version}
+        except Exception as e:
+            payload = {"index": index, "filename": name, "error": str(e)}
+        await results.put(_line(payload))
+
+    async def produce():
+        iterator = iter(items)
+        index = 0
+        try:
+            while True:
+                await slots.acquire()
+                # 读取 zip 目录项同样可能阻塞
+                item = await asyncio.to_thread(next, iterator, None)
+                if item is None:
+                    slots.release()
+                    break
+                name, read = item
+                task = asyncio.get_running_loop().create_task(classify(index, name, read))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                index += 1
+        except Exception as e:
+            # 展开上传内容失败（压缩包损坏等）：输出一行错误并结束，已在途的图片照常输出；
+            # 这一行占用的名额由消费端在输出后释放
+            await results.put(_line({"index": index, "error": f"读取上传内容失败: {e}"}))
+        if tasks:
+            await asyncio.gather(*tasks)
+        await results.put(None)
+
+    producer = asyncio.get_running_loop().create_task(produce())
+    try:
+        while True:
+            line = await results.get()
+            if line is None:
+                break
+            yield line
+            # 结果行交给客户端之后才释放名额
+            slots.release()
+        await producer
+    finally:
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
@@ -0,0 +1,63 @@
+import os
+import argparse
+import compression
+
+# 构建步骤：为静态文本资源（CSS / JS / HTML / SVG）生成同目录的 .br 与 .gz 预压缩文件
+# 服务端按请求的 Accept-Encoding 直接发送压缩文件（见 compression.py），不再逐请求压缩
+# 源文件修改后需重新运行；比源文件旧的压缩文件不会被使用
+# 未安装 brotli（pip install brotli）时只生成 .gz
+# 用法: python compress_assets.py [--dirs All_css All_js All_html .]
+
+default_dirs = ['All_css', 'All_js', 'All_html', '.']
+
+
+def iter_assets(directory):
+    """目录下（不递归）的文本资源"""
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and name.endswith(compression.text_extensions):
+            yield path
+
+
+def compress_file(path, force=False):
+    """为一个文件生成各编码的压缩文件，返回 {编码: 压缩后字节数}；压缩后不更小的编码不保留"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    source_mtime = os.stat(path).st_mtime
+    sizes = {}
+    for encoding, suffix in compression.encoding_suffixes.items():
+        target = path + suffix
+        if not force and os.path.exists(target) and os.stat(target).st_mtime >= source_mtime:
+            sizes[encoding] = os.stat(target).st_size
+            continue
+        compressed = compression.compress(data, encoding)
+        if compressed is None:
+            continue
+        if len(compressed) >= len(data):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        sizes[encoding] = len(compressed)
+    return len(data), sizes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='静态文本资源预压缩（.br / .gz）')
+    parser.add_argument('--dirs', nargs='+', default=default_dirs)
+    parser.add_argument('--force', action='store_true', help='忽略已有的压缩文件，全部重新生成')
+    args = parser.parse_args()
+
+    if compression.brotli is None:
+        print('未安装 brotli，只生成 .gz（pip install brotli 后重新运行可生成 .br）')
+    total_raw = total_gz = total_br = 0
+    print(f'{"file":<40}{"raw":>10}{"gzip":>10}{"br":>10}')
+    for directory in args.dirs:
+        for path in iter_assets(directory):
+            raw, sizes = compress_file(path, args.force)
+            total_raw += raw
+            total_gz += sizes.get('gzip', raw)
+            total_br += sizes.get('br', sizes.get('gzip', raw))
+            print(f'{os.path.normpath(path):<40}{raw:>10}{sizes.get("gzip", "-"):>10}{sizes.get("br", "-"):>10}')
+    print(f'{"合计":<38}{total_raw:>10}{total_gz:>10}{total_br:>10}')
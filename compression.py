@@ -0,0 +1,188 @@
+import os
+import gzip
+import mimetypes
+from email.utils import parsedate_to_datetime
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+try:
+    import brotli
+except ImportError:
+    # brotli 是可选依赖：没有安装时 compress_assets.py 只生成 .gz，服务端照常发送已有的 .br 文件
+    brotli = None
+
+# 响应压缩
+# 静态文本资源由 compress_assets.py 预先压缩为同目录的 .br / .gz 文件，请求时按 Accept-Encoding 直接发送压缩文件；
+# 页面缓存（page_cache.py）在加载页面时压缩到内存；
+# 其余动态 JSON / HTML 响应超过阈值时由 GZipFallback 中间件即时 gzip 压缩
+
+# 会被预压缩的文本资源扩展名（图片、字体本身已经压缩过）
+text_extensions = ('.html', '.css', '.js', '.svg', '.json', '.txt')
+# 服务端偏好顺序：同等 q 值时优先 br
+encoding_suffixes = {'br': '.br', 'gzip': '.gz'}
+# 即时压缩的响应类型
+dynamic_content_types = ('application/json', 'text/html')
+# 即时 gzip 的压缩级别：6 在压缩率与 CPU 开销之间折中（预压缩使用最高级别）
+dynamic_gzip_level = 6
+
+
+def accepted_encodings(header):
+    """解析 Accept-Encoding，返回 {编码: q 值}（q=0 的编码不出现在结果中）"""
+    accepted = {}
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted[name] = q
+    if '*' in accepted:
+        for encoding in encoding_suffixes:
+            accepted.setdefault(encoding, accepted['*'])
+    return accepted
+
+
+def choose_encodings(header, available=tuple(encoding_suffixes)):
+    """客户端可接受的编码，按 q 值从高到低（同 q 值按服务端偏好）排列"""
+    accepted = accepted_encodings(header)
+    candidates = [e for e in available if e in accepted]
+    return sorted(candidates, key=lambda e: -accepted[e])
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'gzip':
+        # mtime=0：相同内容得到相同的压缩结果
+        return gzip.compress(data, compresslevel=9 if level is None else level, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11 if level is None else level)
+    return None
+
+
+def not_modified(request_headers, etag, mtime):
+    """RFC 9110：有 If-None-Match 时只比较 ETag（弱比较），否则比较 If-Modified-Since
+
+    同一资源不同编码的 ETag 带 -br / -gz 后缀，比较时去掉后缀
+    """
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        return etag in (_strip_encoding(tag.strip().removeprefix('W/')) for tag in if_none_match.split(','))
+    if_modified_since = request_headers.get('if-modified-since')
+    if if_modified_since and mtime is not None:
+        try:
+            return int(parsedate_to_datetime(if_modified_since).timestamp()) >= int(mtime)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _strip_encoding(tag):
+    for suffix in ('-br"', '-gz"'):
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def encoded_etag(etag, encoding):
+    return etag[:-1] + ('-br"' if encoding == 'br' else '-gz"') if encoding else etag
+
+
+def precompressed_siblings(full_path, stat_result):
+    """文本资源不旧于源文件的 .br / .gz 预压缩文件：{编码: stat}
+
+    源文件修改后、重新运行 compress_assets.py 之前，旧的压缩文件不再使用
+    """
+    siblings = {}
+    if full_path.endswith(text_extensions):
+        for encoding, suffix in encoding_suffixes.items():
+            try:
+                sibling_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if sibling_stat.st_mtime >= stat_result.st_mtime:
+                siblings[encoding] = sibling_stat
+    return siblings
+
+
+def file_response(full_path, stat_result, request_headers, status_code=200, siblings=None):
+    """文本资源存在预压缩版本且客户端接受该编码时，发送压缩文件
+
+    siblings 为预先取得的 precompressed_siblings() 结果（静态资源清单），省略时现场 stat
+    Content-Type 仍为源文件的类型；ETag 由 FileResponse 按实际发送的文件计算，不同编码互不相同
+    """
+    full_path = os.fspath(full_path)
+    media_type = mimetypes.guess_type(full_path)[0] or 'text/plain'
+    headers = {}
+    if full_path.endswith(text_extensions):
+        headers['Vary'] = 'Accept-Encoding'
+        if siblings is None:
+            siblings = precompressed_siblings(full_path, stat_result)
+        for encoding in choose_encodings(request_headers.get('accept-encoding'), siblings):
+            full_path, stat_result = full_path + encoding_suffixes[encoding], siblings[encoding]
+            headers['Content-Encoding'] = encoding
+            break
+    return FileResponse(full_path, status_code=status_code, headers=headers, media_type=media_type,
+                        stat_result=stat_result)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles 挂载点：文本资源优先发送 .br / .gz 预压缩文件"""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        response = file_response(full_path, stat_result, request_headers, status_code)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class GZipFallback:
+    """ASGI 中间件：未压缩的 JSON / HTML 响应体达到 minimum_size 字节且客户端接受 gzip 时即时压缩
+
+    只处理一次性发送的响应体；流式响应（NDJSON 批量识别等）与已经压缩的响应原样转发
+    """
+
+    def __init__(self, app, minimum_size=1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accepts_gzip = 'gzip' in accepted_encodings(Headers(scope=scope).get('accept-encoding'))
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start['headers'])
+            body = message.get('body', b'')
+            if headers.get('content-type', '').startswith(dynamic_content_types) \
+                    and 'content-encoding' not in headers:
+                if 'accept-encoding' not in headers.get('vary', '').lower():
+                    headers.add_vary_header('Accept-Encoding')
+                if accepts_gzip and not message.get('more_body', False) and len(body) >= self.minimum_size:
+                    body = compress(body, 'gzip', dynamic_gzip_level)
+                    headers['Content-Encoding'] = 'gzip'
+                    headers['Content-Length'] = str(len(body))
+                    message = dict(message, body=body)
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,102 @@
+import os
+import json
+import math
+import time
+import argparse
+import numpy as np
+import torch
+from torchvision import datasets
+import serve_config
+import inference
+import vector_index
+from config import data_root
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 离线任务：把训练集图片编码为特征向量（分类头之前的输出，ResNet18 为 512 维），供 /api/similar 检索
+# 特征 L2 归一化后以 float16 写入内存映射文件 serving/train_embeddings.npy，
+# 再训练 IVF 倒排索引，并报告近似检索相对精确检索的召回率与查询耗时
+# 用法: python embed_dataset.py [--data-dir course_data/train] [--nlist 256] [--nprobe 8]
+
+
+def embed_folder(embedder, root, out_path, batch_size, device):
+    """逐批提取特征直接写入 float16 memmap，内存占用与数据集大小无关；返回 ImageFolder"""
+    inference._ensure_transforms()
+    dataset = datasets.ImageFolder(root=root, transform=inference.data_transforms['test'])
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=2)
+    with torch.no_grad():
+        dim = embedder(dataset[0][0][None].to(device)).shape[1]
+    vectors = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float16, shape=(len(dataset), dim))
+    start = 0
+    with torch.no_grad():
+        for inputs, _ in loader:
+            features = embedder(inputs.to(device)).float().cpu().numpy()
+            vectors[start:start + len(features)] = vector_index.normalize(features)
+            start += len(features)
+    vectors.flush()
+    return dataset
+
+
+def time_search(index, queries, k, repeat=3):
+    """单条查询的平均耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        for query in queries:
+            index.search(query[None, :], k)
+        best = min(best, time.perf_counter() - begin)
+    return best / len(queries) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='训练集特征提取与向量索引构建')
+    parser.add_argument('--weights', default=inference.weight_path)
+    parser.add_argument('--data-dir', default=os.path.join(data_root, 'train'))
+    parser.add_argument('--artifact-dir', default=serve_config.artifact_dir)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--nlist', type=int, default=None, help='IVF 簇数（默认约为 sqrt(N)）')
+    parser.add_argument('--nprobe', type=int, default=serve_config.similar_nprobe, help='评估召回率时扫描的簇数')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200, help='评估用的查询数')
+    args = parser.parse_args()
+
+    device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+    os.makedirs(args.artifact_dir, exist_ok=True)
+    paths = vector_index.index_paths(args.artifact_dir)
+
+    start = time.perf_counter()
+    embedder = inference.load_embedder(args.weights, device)
+    dataset = embed_folder(embedder, args.data_dir, paths['vectors'], args.batch_size, device)
+    print(f'提取 {len(dataset)} 张图片的特征用时 {time.perf_counter() - start:.1f}s -> {paths["vectors"]}')
+
+    meta = {
+        'root': args.data_dir,
+        'paths': [os.path.relpath(path, args.data_dir) for path, _ in dataset.samples],
+        # ImageFolder 按文件夹名排序编号，文件夹 0~9 与 inference.class_names 的顺序一致
+        'labels': [label for _, label in dataset.samples],
+        'dim': int(np.load(paths['vectors'], mmap_mode='r').shape[1]),
+        'model_version': inference._file_version(args.weights),
+    }
+    with open(paths['meta'], 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    vectors = np.load(paths['vectors'], mmap_mode='c')
+    nlist = args.nlist or max(1, min(int(math.sqrt(len(vectors))), len(vectors) // 39 or 1))
+    start = time.perf_counter()
+    vector_index.build_ivf(vectors, paths, nlist)
+    print(f'训练 IVF 索引（nlist={nlist}）用时 {time.perf_counter() - start:.1f}s -> {paths["ivf"]}')
+
+    # 用训练集中的随机样本作为查询，比较近似检索与精确检索
+    rng = np.random.default_rng(0)
+    queries = np.asarray(vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)],
+                         dtype=np.float32)
+    exact, _ = vector_index.load_index(args.artifact_dir, 'exact')
+    _, exact_ids = exact.search(queries, args.k)
+    print(f'\n{"索引":<16}{"单次查询 ms":>12}{"recall@" + str(args.k):>12}')
+    print(f'{"exact":<16}{time_search(exact, queries, args.k):>12.2f}{1.0:>12.3f}')
+    for nprobe in sorted({max(1, args.nprobe // 2), args.nprobe, args.nprobe * 2, args.nprobe * 4}):
+        ivf, _ = vector_index.load_index(args.artifact_dir, 'ivf', nprobe)
+        _, ivf_ids = ivf.search(queries, args.k)
+        print(f'{"ivf nprobe=" + str(nprobe):<16}{time_search(ivf, queries, args.k):>12.2f}'
+              f'{vector_index.recall_at_k(exact_ids, ivf_ids):>12.3f}')
@@ -0,0 +1,78 @@
+import os
+import sys
+import argparse
+import torch
+import backends
+import serve_config
+from inference import load_classifier, weight_path
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 服务端模型导出：cifar10_best.pt -> TorchScript / torch.export(.pt2) / ONNX
+# 导出后逐一与 eager 模型比对输出（一致性检查），不一致时以非零状态码退出
+# --check 不重新导出，只检查已有产物与当前权重是否一致，可在部署或更换 torch 版本后单独运行
+# 缺少可选依赖（onnx / onnxruntime）的后端：默认跳过并给出安装提示，用 --backends 明确指定时视为失败
+# 用法: python export_model.py [--backends torchscript onnx] [--artifact-dir serving]
+#       python export_model.py --check
+
+# 一致性检查的批大小与容差
+parity_batch_sizes = [1, 7, 64]
+parity_atol = 1e-4
+
+
+def check_parity(reference, candidate, device):
+    """比较两个模型在随机输入上的 logits，返回 (最大绝对误差, 预测类别是否完全一致)"""
+    generator = torch.Generator().manual_seed(0)
+    max_diff = 0.0
+    same_preds = True
+    with torch.no_grad():
+        for batch_size in parity_batch_sizes:
+            inputs = torch.randn(batch_size, 3, 32, 32, generator=generator).to(device)
+            expected = reference(inputs)
+            actual = candidate(inputs)
+            max_diff = max(max_diff, (expected - actual).abs().max().item())
+            same_preds = same_preds and torch.equal(expected.argmax(1), actual.argmax(1))
+    return max_diff, same_preds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='导出服务端推理模型')
+    parser.add_argument('--weights', default=weight_path, help='训练得到的权重文件')
+    parser.add_argument('--artifact-dir', default=serve_config.artifact_dir, help='导出目录')
+    parser.add_argument('--backends', nargs='+', default=None,
+                        choices=list(backends.exporters), help='要导出的后端（默认全部）')
+    parser.add_argument('--check', action='store_true', help='不导出，只检查已有产物与 eager 模型的一致性')
+    args = parser.parse_args()
+    kinds = args.backends or list(backends.exporters)
+
+    device = torch.device('cpu')
+    os.makedirs(args.artifact_dir, exist_ok=True)
+
+    print(f"加载模型权重: {args.weights}")
+    eager_model = load_classifier(args.weights, device)
+    serving_model = backends.prepare_for_serving(load_classifier(args.weights, device))
+    example = torch.randn(2, 3, 32, 32)
+
+    failed = False
+    for kind in kinds:
+        path = backends.artifact_path(kind, args.artifact_dir)
+        try:
+            if not args.check:
+                backends.exporters[kind](serving_model, path, example)
+            loaded = backends.load_backend(kind, args.artifact_dir, device)
+        except backends.MissingDependency as e:
+            failed = failed or args.backends is not None
+            print(f"{kind:<12} 跳过: {e}")
+            continue
+        except FileNotFoundError:
+            failed = True
+            print(f"{kind:<12} 失败: 产物 {path} 不存在，请先运行 python export_model.py --backends {kind}")
+            continue
+        max_diff, same_preds = check_parity(eager_model, loaded, device)
+        ok = max_diff <= parity_atol and same_preds
+        failed = failed or not ok
+        print(f"{kind:<12} -> {path}  最大误差 {max_diff:.2e}  "
+              f"类别一致 {same_preds}  {'通过' if ok else '失败'}")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,101 @@
+import io
+from PIL import Image
+
+# 快速解码：模型输入只有 32x32，没必要把几百万像素的原图完整解码成 RGB 再缩放
+# JPEG 使用 draft() 让解码器直接按 1/2、1/4、1/8 缩小解码；
+# PNG / WebP 等格式先以原始模式解码，再用 reduce() 按 2 的幂次快速缩小，最后才转换为 RGB
+# 调色板 / 二值图不能直接 reduce()，按条带展开后逐条缩小，全分辨率的 RGB 图像从不完整存在
+
+# 快速缩小后至少保留目标边长的倍数，留给最终的抗锯齿缩放
+reduce_headroom = 2
+
+# 接受的图片格式；其他格式（TIFF、PSD 等）在解码前直接拒绝
+allowed_formats = {'JPEG', 'PNG', 'WEBP', 'GIF', 'BMP'}
+
+# 默认像素上限：解压炸弹的文件很小，但完整解码会占用数 GB 内存
+max_image_pixels = 40_000_000
+
+# reduce() 可以直接处理的模式；调色板等其他模式只能先转换
+_reducible_modes = {'L', 'LA', 'RGB', 'RGBA'}
+
+# 条带展开时每条包含的输出行数（每条 reduce_factor * strip_rows 行原图）
+strip_rows = 4
+
+
+class UnsupportedImage(ValueError):
+    """无法识别的图片或不接受的格式"""
+
+
+class TruncatedHeader(UnsupportedImage):
+    """格式已识别，但头部在数据末尾被截断（只拿到上传的开头部分时，读到更多字节后可能解析成功）"""
+
+
+class ImageTooLarge(ValueError):
+    """图片像素数超过上限"""
+
+
+def open_checked(contents, max_pixels=max_image_pixels):
+    """只解析图片头部（不解码像素），检查格式与像素数，返回尚未解码的 PIL 图片"""
+    try:
+        image = Image.open(io.BytesIO(contents))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e)) from None
+    except Image.UnidentifiedImageError as e:
+        raise UnsupportedImage(f"无法识别的图片: {e}") from None
+    except (OSError, SyntaxError) as e:
+        # 插件认出了文件头，但读取头部时数据不足（如 JPEG 的 EXIF / ICC 段很长）
+        raise TruncatedHeader(f"无法识别的图片: {e}") from None
+    if image.format not in allowed_formats:
+        raise UnsupportedImage(f"不支持的图片格式: {image.format}")
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"图片尺寸 {width}x{height} 超过 {max_pixels} 像素上限")
+    return image
+
+
+def reduce_factor(width, height, target):
+    """最大的 2 的幂次缩小倍数，使较短边仍不小于 target * reduce_headroom"""
+    factor = 1
+    while min(width, height) // (factor * 2) >= target * reduce_headroom:
+        factor *= 2
+    return factor
+
+
+def reduce_in_strips(image, factor):
+    """不能直接 reduce() 的模式：逐条展开为 L / RGB / RGBA 再缩小，结果与整图展开后 reduce() 相同"""
+    if image.mode == '1':
+        mode = 'L'
+    elif 'transparency' in image.info or image.mode in ('PA', 'RGBa'):
+        mode = 'RGBA'
+    else:
+        mode = 'RGB'
+    width, height = image.size
+    reduced = Image.new(mode, (-(-width // factor), -(-height // factor)))
+    step = factor * strip_rows
+    for top in range(0, height, step):
+        strip = image.crop((0, top, width, min(height, top + step))).convert(mode)
+        reduced.paste(strip.reduce(factor), (0, top // factor))
+    return reduced
+
+
+def open_reduced(image, target=32):
+    """把已打开（尚未解码）的 PIL 图片解码为接近目标尺寸的 RGB 图片"""
+    wanted = target * reduce_headroom
+    if image.format == 'JPEG':
+        # 解码器直接输出缩小后的 RGB 图像，全分辨率像素从不落地
+        image.draft('RGB', (wanted, wanted))
+    factor = reduce_factor(image.width, image.height, target)
+    if factor > 1:
+        if image.mode in _reducible_modes:
+            image = image.reduce(factor)
+        else:
+            # 调色板/二值图无法按块平均，按条带展开后再缩小
+            image = reduce_in_strips(image, factor)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def decode_for_model(contents, target=32, max_pixels=max_image_pixels):
+    """图片字节 -> 接近 target 尺寸的 RGB 图片，供 transforms.Resize 做最后一步缩放"""
+    return open_reduced(open_checked(contents, max_pixels), target)
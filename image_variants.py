@@ -0,0 +1,272 @@
+import io
+import os
+import re
+import json
+import base64
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# 响应式图片：picture/ 中的原图按固定宽度档位生成 AVIF / WebP（或 JPEG）缩略图，
+# 由 GET /img/{name}?w= 按 Accept 头选择格式发送；缩略图缓存在磁盘上，总大小有上限，超出时淘汰最久未用的文件
+# 页面缓存加载页面时用 rewrite_html 把 <img src="/picture/..."> 改写为 srcset，
+# 并内联一张模糊的小占位图作为背景，原图加载前先显示轮廓
+# build_images.py 预先生成全部缩略图并报告每次页面访问的图片字节数
+
+# 宽度档位：请求的宽度向上取整到档位，缓存中的文件数有上限
+variant_widths = (320, 480, 800, 1200)
+# 格式按服务端偏好排列：浏览器在 Accept 中声明支持时依次选用，都不支持时退回 JPEG
+variant_formats = ('avif', 'webp', 'jpeg')
+media_types = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# 各格式的编码质量（AVIF 同等画质下可以用更低的质量参数）
+qualities = {'avif': 50, 'webp': 75, 'jpeg': 80}
+# 模糊占位图的宽度（像素），以 base64 内联到页面中
+placeholder_width = 24
+# <img> 的 sizes：页面中的卡片在窄屏上占满宽度，宽屏上为三列
+default_sizes = '(max-width: 600px) 100vw, (max-width: 1000px) 50vw, 33vw'
+# 内联 background 图片（轮播图、卡片缩略图）使用的宽度
+background_width = 1200
+image_extensions = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def snap_width(width, source_width):
+    """请求的宽度 -> 不小于它的最小档位；不超过原图宽度（不放大）"""
+    if width is None:
+        return min(variant_widths[-1], source_width)
+    for candidate in variant_widths:
+        if candidate >= width:
+            return min(candidate, source_width)
+    return min(variant_widths[-1], source_width)
+
+
+def negotiate_format(accept):
+    """按 Accept 头选择格式：image/avif > image/webp > JPEG"""
+    accept = accept or ''
+    for fmt in variant_formats[:-1]:
+        if media_types[fmt] in accept:
+            return fmt
+    return 'jpeg'
+
+
+def source_signature(path):
+    stat = os.stat(path)
+    return hashlib.blake2b(f'{stat.st_mtime_ns}:{stat.st_size}'.encode(), digest_size=4).hexdigest()
+
+
+def _open_rgb(path, width=None):
+    from PIL import Image
+    image = Image.open(path)
+    if width is not None and image.format == 'JPEG':
+        # JPEG 在解码时按 1/2、1/4、1/8 缩小，大图只解码需要的分辨率
+        image.draft('RGB', (width, width * image.height // image.width))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variant(path, width, fmt):
+    """原图缩小到 width 宽（保持宽高比）并编码为 fmt，返回字节"""
+    from PIL import Image
+    image = _open_rgb(path, width)
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, fmt.upper(), quality=qualities[fmt])
+    return buffer.getvalue()
+
+
+def describe(path):
+    """页面改写需要的信息：原图尺寸与模糊占位图（data URI）"""
+    from PIL import Image, ImageFilter
+    with Image.open(path) as image:
+        size = image.size
+    tiny = _open_rgb(path, placeholder_width)
+    tiny = tiny.resize((placeholder_width, max(1, round(tiny.height * placeholder_width / tiny.width))),
+                       Image.BILINEAR).filter(ImageFilter.GaussianBlur(1.5))
+    buffer = io.BytesIO()
+    tiny.save(buffer, 'WEBP', quality=30)
+    return {
+        'width': size[0],
+        'height': size[1],
+        'placeholder': 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+    }
+
+
+class DerivativeCache:
+    """磁盘上的缩略图缓存：文件名包含原图签名，原图修改后自然失效；总字节数超过 max_bytes 时按 LRU 淘汰"""
+
+    def __init__(self, source_dir, cache_dir, max_bytes):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # 原图信息（尺寸、占位图）持久化在 manifest.json 中，重启后不必重新解码原图
+        self._manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self._info = {}
+        self.hits = 0
+        self.generated = 0
+        self.evicted = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding='utf-8') as f:
+                self._info = json.load(f)
+        # 已有的缓存文件按修改时间从旧到新排列
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith('.tmp'):
+                # 上次进程中断时留下的临时文件
+                os.remove(os.path.join(cache_dir, name))
+            elif name.endswith(tuple('.' + f for f in variant_formats)):
+                stat = os.stat(os.path.join(cache_dir, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+
+    def source_path(self, name):
+        """picture/ 下存在的图片文件路径；名称不合法或文件不存在时返回 None"""
+        if name != os.path.basename(name) or not name.lower().endswith(image_extensions):
+            return None
+        path = os.path.join(self.source_dir, name)
+        return path if os.path.isfile(path) else None
+
+    def info(self, name):
+        """原图尺寸与占位图，按原图签名缓存（内存 + manifest.json）；可在多个线程中同时调用"""
+        path = self.source_path(name)
+        if path is None:
+            return None
+        key = f'{name}:{source_signature(path)}'
+        info = self._info.get(key)
+        if info is None:
+            # 解码原图较慢，不持有锁；同一图片被并发描述时结果相同，后写入的覆盖先写入的
+            info = describe(path)
+            with self._lock:
+                self._info[key] = info
+                self._write_atomic(self._manifest_path, json.dumps(self._info).encode('utf-8'))
+        return info
+
+    def _write_atomic(self, target, data):
+        """写入同目录下唯一的临时文件后原子替换，并发写入互不干扰"""
+        fd, temp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp, target)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def get(self, name, width, fmt):
+        """返回缩略图文件路径（不存在时生成）；原图不存在时返回 None。会阻塞，应在线程中调用
+
+        返回的文件随时可能被淘汰删除，需要读取内容时用 read()
+        """
+        result = self._acquire(name, width, fmt, open_file=False)
+        return result and result[1]
+
+    def read(self, name, width, fmt):
+        """返回 (缩略图内容, ETag)；原图不存在时返回 None。会阻塞，应在线程中调用
+
+        文件在锁内打开，之后即使被淘汰删除（POSIX 上已打开的文件仍可读完），也不会读到不完整的内容
+        """
+        result = self._acquire(name, width, fmt, open_file=True)
+        if result is None:
+            return None
+        filename, f = result
+        with f:
+            data = f.read()
+        return data, '"' + hashlib.blake2b(filename.encode('utf-8'), digest_size=8).hexdigest() + '"'
+
+    def _acquire(self, name, width, fmt, open_file):
+        """(缓存文件名, 路径或已打开的文件)；原图不存在时返回 None"""
+        path = self.source_path(name)
+        if path is None:
+            return None
+        width = snap_width(width, self.info(name)['width'])
+        stem, _ = os.path.splitext(name)
+        filename = f'{stem}.{source_signature(path)}.w{width}.{fmt}'
+        target = os.path.join(self.cache_dir, filename)
+        with self._lock:
+            if filename in self._files:
+                self._files.move_to_end(filename)
+                self.hits += 1
+                return filename, open(target, 'rb') if open_file else target
+            # 同一缩略图只生成一次，其余请求等待
+            event = self._inflight.get(filename)
+            owner = event is None
+            if owner:
+                event = self._inflight[filename] = threading.Event()
+        if not owner:
+            event.wait()
+            return self._acquire(name, width, fmt, open_file)
+        try:
+            data = render_variant(path, width, fmt)
+            self._write_atomic(target, data)
+            with self._lock:
+                result = filename, open(target, 'rb') if open_file else target
+                self._files[filename] = len(data)
+                self._bytes += len(data)
+                self.generated += 1
+                self._evict()
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(filename, None)
+            event.set()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            filename, size = self._files.popitem(last=False)
+            self._bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'generated': self.generated, 'evicted': self.evicted}
+
+
+_img_tag = re.compile(r'<img\s+src="/(?:picture|static/images)/([^"/]+)"([^>]*)>')
+_background_url = re.compile(r'url\((["\']?)/(?:picture|static/images)/([^"\')/]+)\1\)')
+
+
+def srcset(name, source_width):
+    widths = [w for w in variant_widths if w < source_width] + [snap_width(None, source_width)]
+    return ', '.join(f'/img/{name}?w={w} {w}w' for w in sorted(set(widths)))
+
+
+def rewrite_html(body, cache):
+    """<img src="/picture/x.png"> -> 带 srcset / sizes / 宽高 / 懒加载 / 模糊占位背景的 <img>；
+    内联样式中的 url(/picture/x.png) -> url(/img/x.png?w=1200)。不存在的图片保持原样"""
+
+    def img(match):
+        name, rest = match.group(1), match.group(2)
+        info = cache.info(name)
+        if info is None:
+            return match.group(0)
+        return (f'<img src="/img/{name}?w={variant_widths[2]}" srcset="{srcset(name, info["width"])}" '
+                f'sizes="{default_sizes}" width="{info["width"]}" height="{info["height"]}" '
+                f'loading="lazy" decoding="async" '
+                f'style="background:url({info["placeholder"]}) center/cover no-repeat"{rest}>')
+
+    def background(match):
+        name = match.group(2)
+        if cache.source_path(name) is None:
+            return match.group(0)
+        return f'url(/img/{name}?w={background_width})'
+
+    text = body.decode('utf-8')
+    text = _img_tag.sub(img, text)
+    text = _background_url.sub(background, text)
+    return text.encode('utf-8')
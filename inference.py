@@ -0,0 +1,426 @@
+import os
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import serve_config
+
+# 推理核心：模型加载、图片预处理与批量前向传播
+# 全部是模块级函数 + 模块级状态：线程池中各线程共享同一个模型，
+# 进程池中每个 worker 进程通过 initializer 各自加载一份模型
+# 权重文件更新后由后台线程加载、预热新版本，在两个批次之间原子替换（见 reload_if_changed）
+
+_model = None
+class_names = ['飞机', '汽车', '鸟', '猫', '鹿', '狗', '青蛙', '马', '船', '卡车']
+weight_path = serve_config.weights
+device = None
+data_transforms = None
+_load_lock = threading.Lock()
+# 冷启动各阶段耗时（秒），由 startup() 填充
+startup_report = {}
+# 当前生效模型的版本信息（version / path / load_s / loaded_at），与 _model 一起替换
+model_info = {}
+_swap_lock = threading.Lock()
+_watcher = None
+# 等待稳定的文件签名：训练脚本可能仍在写入，签名连续两次相同才加载
+_pending_signature = None
+# 相似图片检索：特征提取器、训练集向量索引及其元数据（文件路径、标签），首次检索时加载
+_embedder = None
+_index = None
+_index_meta = None
+_index_lock = threading.Lock()
+
+
+def ensure_model_loaded():
+    """加载模型（只加载一次，失败时不抛异常，避免 ASGI 无法启动），返回模型是否可用"""
+    if _model is not None:
+        return True
+    # 线程池中多个线程可能同时触发首次加载，只允许加载一次
+    with _load_lock:
+        if _model is not None:
+            return True
+        return _load_model()
+
+
+def build_classifier(num_classes, device, model_name='resnet18'):
+    """与训练时相同的网络结构（model.model_registry 中的名称，默认 ResNet18）
+
+    只构建网络结构，不下载 ImageNet 预训练权重：
+    cifar10_best.pt 会覆盖全部参数，离线环境也能启动
+    """
+    from model import build_model
+    model = build_model(model_name, num_classes)
+    for p in model.parameters():
+        p.requires_grad = False
+    return model.to(device)
+
+
+def load_classifier(path, device):
+    """按检查点中的 model_name 构建网络并加载训练得到的权重，返回 eval 模式的模型
+
+    旧检查点没有 model_name 字段，按 ResNet18 处理
+    """
+    import torch
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"权重文件不存在: {path}")
+    checkpoint = torch.load(path, map_location=device)
+    model = build_classifier(len(class_names), device, checkpoint.get('model_name', 'resnet18'))
+    model.load_state_dict(checkpoint['state_dict'])
+    return model.eval()
+
+
+def model_source_path():
+    """当前后端实际加载的文件：eager / bf16 为训练权重，其余为导出产物"""
+    import backends
+    if serve_config.backend in ('eager', 'bf16'):
+        return weight_path
+    return backends.artifact_path(serve_config.backend, serve_config.artifact_dir)
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_version(path):
+    """文件内容的 SHA-256 前 12 位作为模型版本号"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+_file_versions = {}
+
+
+def model_file_info():
+    """不加载模型，只按磁盘上的模型文件给出版本信息（文件未变化时复用上次的哈希）
+
+    进程池模式下主进程没有模型、各 worker 各自热更新，由主进程读取文件版本，
+    结果不取决于恰好由哪个 worker 应答
+    """
+    path = model_source_path()
+    signature = _file_signature(path)
+    cached = _file_versions.get(path)
+    if cached is None or cached[0] != signature:
+        cached = _file_versions[path] = (signature, _file_version(path))
+    return {'version': cached[1], 'path': path, 'backend': serve_config.backend}
+
+
+def _load_version():
+    """加载当前后端的一个模型版本，返回 (模型, 版本信息)；不修改全局状态"""
+    import backends
+    path = model_source_path()
+    signature = _file_signature(path)
+    step = time.perf_counter()
+    model = backends.load_backend(serve_config.backend, serve_config.artifact_dir, device, weight_path)
+    if serve_config.cascade:
+        model = backends.load_cascade(model, serve_config.cascade_weights, device, serve_config.cascade_threshold)
+    info = {
+        'version': _file_version(path),
+        'path': path,
+        'signature': signature,
+        'load_s': round(time.perf_counter() - step, 3),
+        'loaded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    return model, info
+
+
+def _load_model():
+    global _model, device, model_info
+    try:
+        start = time.perf_counter()
+        os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+        import torch
+        startup_report['import_s'] = round(time.perf_counter() - start, 3)
+
+        device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+        if serve_config.backend in ('int8', 'dynamic'):
+            device = torch.device('cpu')
+        _ensure_transforms()
+        _loc_model, info = _load_version()
+        startup_report['load_s'] = info['load_s']
+
+        _model, model_info = _loc_model, info
+        startup_report['backend'] = serve_config.backend
+        startup_report['device'] = str(device)
+        return True
+    except Exception as e:
+        print(f"模型加载失败或未安装依赖: {e}")
+        startup_report['error'] = str(e)
+        _model = None
+        return False
+
+
+def get_model_info():
+    """当前生效模型的版本信息（不含内部使用的文件签名）"""
+    with _swap_lock:
+        info = dict(model_info)
+        model = _model
+    info.pop('signature', None)
+    info['backend'] = serve_config.backend
+    if serve_config.cascade and model is not None:
+        info['cascade'] = model.stats()
+    return info
+
+
+def reload_if_changed(warmup_passes=3):
+    """检查模型文件是否有新版本；有则加载并预热新模型，再原子替换当前模型
+
+    替换只是一次引用赋值：正在计算的批次继续使用旧模型，下一个批次开始使用新模型，
+    请求不会中断。返回是否发生了替换。
+    """
+    global _model, model_info, _pending_signature
+    if _model is None:
+        return False
+    path = model_info['path']
+    try:
+        signature = _file_signature(path)
+    except OSError:
+        return False
+    if signature == model_info['signature']:
+        return False
+    if signature != _pending_signature:
+        _pending_signature = signature
+        return False
+    try:
+        candidate, info = _load_version()
+        if info['version'] == model_info['version']:
+            # 内容未变（例如只是 touch 了文件）
+            with _swap_lock:
+                model_info['signature'] = info['signature']
+            return False
+        warmup(warmup_passes, sorted({1, serve_config.max_batch_size}), model=candidate)
+    except Exception as e:
+        # 文件可能写了一半；等待下一次变化后再试
+        print(f"新模型加载失败，继续使用版本 {model_info['version']}: {e}")
+        with _swap_lock:
+            model_info['signature'] = signature
+            model_info['reload_error'] = str(e)
+        return False
+    with _swap_lock:
+        previous = model_info['version']
+        _model, model_info = candidate, info
+    print(f"模型已热更新: {previous} -> {info['version']}（加载 {info['load_s']}s）")
+    return True
+
+
+def start_watcher(interval, warmup_passes=3):
+    """启动后台线程，每 interval 秒检查一次模型文件"""
+    global _watcher
+    if interval <= 0 or (_watcher is not None and _watcher.is_alive()):
+        return
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                reload_if_changed(warmup_passes)
+            except Exception as e:
+                print(f"模型热更新检查出错: {e}")
+
+    _watcher = threading.Thread(target=watch, name='model-watcher', daemon=True)
+    _watcher.start()
+
+
+def _ensure_transforms():
+    """预处理只依赖 torchvision，不需要模型：远程推理模式下 web worker 只做这一步"""
+    global data_transforms
+    if data_transforms is not None:
+        return
+    from torchvision import transforms
+    data_transforms = {
+        'test': transforms.Compose([
+            transforms.Resize((32, 32)),
+            transforms.ToTensor(),
+            transforms.Normalize((0.4914, 0.4822, 0.4465), (0.2023, 0.1994, 0.2010))
+        ])
+    }
+
+
+def warmup(passes=3, batch_sizes=(1,), model=None):
+    """用全零输入跑几次前向传播，提前完成算子选择、内存分配和 torch.compile 编译
+
+    model 为空时预热当前模型；热更新时传入尚未生效的新模型
+    """
+    import torch
+    model = _model if model is None else model
+    step = time.perf_counter()
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            dummy = torch.zeros(batch_size, 3, 32, 32, device=device)
+            for _ in range(passes):
+                model(dummy)
+    return round(time.perf_counter() - step, 3)
+
+
+def startup(warmup_passes=3, warm_similar=True):
+    """服务启动阶段：加载模型并在单张和满批两种批大小上预热，返回冷启动耗时报告
+
+    warm_similar=False 时不预先加载相似图片索引（首次检索时再加载）
+    """
+    start = time.perf_counter()
+    ready = ensure_model_loaded()
+    if ready and 'warmup_s' not in startup_report:
+        startup_report['warmup_s'] = warmup(warmup_passes, sorted({1, serve_config.max_batch_size}))
+    if ready:
+        start_watcher(serve_config.reload_interval_s, warmup_passes)
+        if warm_similar:
+            _warm_similar_index()
+    startup_report['ready'] = ready
+    startup_report.setdefault('total_s', round(time.perf_counter() - start, 3))
+    return dict(startup_report, model=get_model_info())
+
+
+def preprocess(contents):
+    """图片字节 -> 归一化后的 3x32x32 张量（解码时即缩小，见 image_decode.py）"""
+    from image_decode import decode_for_model
+    _ensure_transforms()
+    image = decode_for_model(contents, target=32, max_pixels=serve_config.max_image_pixels)
+    return data_transforms['test'](image)
+
+
+def tensor_key(image_tensor):
+    """归一化张量量化到 1/32 精度后的哈希：同一张图的不同编码通常得到相同的键"""
+    import torch
+    quantized = torch.round(image_tensor * 32).clamp(-128, 127).to(torch.int8)
+    return hashlib.blake2b(quantized.numpy().tobytes(), digest_size=16).hexdigest()
+
+
+def preprocess_with_key(contents):
+    """预处理并同时计算缓存键，返回 (张量, 张量键, 各阶段耗时)
+
+    耗时在执行器内测量并随结果返回，进程池模式下也能由主进程汇总
+    """
+    from image_decode import decode_for_model
+    _ensure_transforms()
+    start = time.perf_counter()
+    image = decode_for_model(contents, target=32, max_pixels=serve_config.max_image_pixels)
+    decoded = time.perf_counter()
+    image_tensor = data_transforms['test'](image)
+    key = tensor_key(image_tensor)
+    timings = {'decode': decoded - start, 'transform': time.perf_counter() - decoded}
+    return image_tensor, key, timings
+
+
+def predict_batch(image_tensors):
+    """对一批预处理后的张量做一次前向传播，按顺序返回 (类别, 置信度, 模型版本)"""
+    import torch
+    ensure_model_loaded()
+    # 整个批次固定使用同一个模型版本，热更新只在批次之间生效
+    with _swap_lock:
+        model, version = _model, model_info['version']
+    batch = torch.stack(image_tensors).to(device)
+    with torch.no_grad():
+        outputs = model(batch)
+        probs = torch.softmax(outputs, dim=1)
+        conf, preds = torch.max(probs, 1)
+    return [
+        (class_names[p], float(round(c * 100, 2)), version)
+        for c, p in zip(conf.tolist(), preds.tolist())
+    ]
+
+
+def load_embedder(path, device):
+    """去掉分类头的分类模型：输出分类头之前的特征（ResNet18 为 512 维）"""
+    from torch import nn
+    model = load_classifier(path, device)
+    # MobileNetV3 的分类头是 classifier，注册表中其余模型都是 fc
+    setattr(model, 'classifier' if hasattr(model, 'classifier') else 'fc', nn.Identity())
+    return model
+
+
+def ensure_index_loaded():
+    """首次相似检索时加载特征提取器与训练集向量索引（与分类模型相互独立）"""
+    global _embedder, _index, _index_meta
+    if _index is not None:
+        return
+    with _index_lock:
+        if _index is not None:
+            return
+        import torch
+        from vector_index import load_index
+        index, meta = load_index(serve_config.artifact_dir, serve_config.similar_index, serve_config.similar_nprobe)
+        embed_device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+        embedder = load_embedder(weight_path, embed_device)
+        with torch.no_grad():
+            dim = embedder(torch.zeros(1, 3, 32, 32, device=embed_device)).shape[1]
+        # 换成其他结构的模型（如蒸馏得到的学生）后特征维度不同，旧索引无法使用
+        if meta.get('dim', 512) != dim:
+            raise ValueError(f"向量索引为 {meta.get('dim', 512)} 维，当前模型的特征为 {dim} 维，请重新运行 embed_dataset.py")
+        if meta.get('model_version') != _file_version(weight_path):
+            print(f"警告: 向量索引由模型 {meta.get('model_version')} 生成，与当前权重不一致，请重新运行 embed_dataset.py")
+        _embedder = embedder
+        _index_meta = meta
+        _index = index
+
+
+def embed_batch(image_tensors):
+    """一批预处理后的张量 -> L2 归一化后的 float32 特征矩阵"""
+    import torch
+    from vector_index import normalize
+    device = next(_embedder.parameters()).device
+    with torch.no_grad():
+        features = _embedder(torch.stack(image_tensors).to(device))
+    return normalize(features.float().cpu().numpy())
+
+
+def similar_batch(items):
+    """items 为 (张量, k) 列表；对每个查询返回训练集中最相似的 k 张图片"""
+    ensure_index_loaded()
+    queries = embed_batch([image_tensor for image_tensor, _ in items])
+    scores, ids = _index.search(queries, max(k for _, k in items))
+    labels = _index_meta['labels']
+    results = []
+    for row, (_, k) in enumerate(items):
+        results.append([
+            {'id': int(i), 'class': class_names[labels[i]], 'score': round(float(score), 4)}
+            for i, score in zip(ids[row, :k].tolist(), scores[row, :k].tolist()) if i >= 0
+        ])
+    return results
+
+
+def _warm_similar_index():
+    """已生成相似图片索引时提前加载并跑一次检索，首个 /api/similar 请求无需等待"""
+    import torch
+    from vector_index import index_paths
+    if not os.path.exists(index_paths(serve_config.artifact_dir)['vectors']):
+        return
+    step = time.perf_counter()
+    try:
+        similar_batch([(torch.zeros(3, 32, 32), 1)])
+    except Exception as e:
+        print(f"相似图片索引加载失败: {e}")
+        return
+    startup_report['similar_index_s'] = round(time.perf_counter() - step, 3)
+
+
+def similar_image_path(item_id):
+    """训练集图片编号 -> 文件路径；编号无效时返回 None"""
+    ensure_index_loaded()
+    paths = _index_meta['paths']
+    if not 0 <= item_id < len(paths):
+        return None
+    return os.path.join(_index_meta['root'], paths[item_id])
+
+
+def create_executor(kind='thread', workers=1, warmup_passes=3, load_model=True):
+    """创建推理执行器
+
+    thread: 线程池，共享进程内的同一个模型（PyTorch 前向传播会释放 GIL）
+    process: 进程池，每个 worker 进程启动时加载并预热自己的模型，解码也不受 GIL 限制
+    load_model=False 时（远程模型服务模式）执行器只做解码与预处理，进程池不加载模型
+    """
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+    if kind == 'process':
+        # 使用 spawn，避免 fork 已初始化 OpenMP 线程池的父进程导致死锁
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=startup if load_model else None,
+            initargs=(warmup_passes,) if load_model else (),
+        )
+    raise ValueError(f"未知的推理执行器类型: {kind}（可选 thread / process）")
@@ -0,0 +1,151 @@
+import bisect
+
+# 轻量的 Prometheus 文本格式指标（不依赖 prometheus_client）
+# 所有观测都在事件循环线程中进行，不需要加锁；一次 observe 只是一次二分查找加几次整数/浮点加法，
+# 导出时才把各桶累加成 Prometheus 要求的累计计数
+
+# 延迟直方图的桶上限（秒）
+latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 批大小直方图的桶上限
+batch_size_buckets = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramSeries:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=latency_buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+
+    def labels(self, *values):
+        """按标签值取得一条序列（同一组标签值始终返回同一个对象，可以提前取好复用）"""
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = _HistogramSeries(self.buckets)
+        return series
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def export(self, *labelvalues):
+        """一条序列的原始计数（可 JSON 序列化），用于把其他进程中的观测汇报过来"""
+        series = self.labels(*labelvalues)
+        return {'counts': list(series.counts), 'sum': series.sum, 'count': series.count}
+
+    def restore(self, state, *labelvalues):
+        """用 export() 的结果覆盖一条序列；桶上限必须相同"""
+        series = self.labels(*labelvalues)
+        if len(state['counts']) != len(series.counts):
+            raise ValueError(f"{self.name}: 桶数量不一致（{len(state['counts'])} != {len(series.counts)}）")
+        series.counts = list(state['counts'])
+        series.sum = float(state['sum'])
+        series.count = int(state['count'])
+
+    def samples(self):
+        for values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series.counts):
+                cumulative += count
+                labels = _label_text(self.labelnames, values, [('le', _number(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _label_text(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_number(series.sum)}'
+            yield f'{self.name}_count{labels} {series.count}'
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def set(self, value, *labelvalues):
+        self._values[labelvalues] = value
+
+    def clear(self):
+        self._values.clear()
+
+    def samples(self):
+        for values, value in self._values.items():
+            yield f'{self.name}{_label_text(self.labelnames, values)} {_number(value)}'
+
+
+class Callback:
+    """导出时才取值的指标：fn() 返回数值，或 {标签值元组: 数值} 字典"""
+
+    def __init__(self, name, documentation, kind, fn, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.fn()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, number in items:
+            yield f'{self.name}{_label_text(self.labelnames, values)} {_number(number)}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, buckets=latency_buckets, labelnames=()):
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def callback(self, name, documentation, kind, fn, labelnames=()):
+        return self.register(Callback(name, documentation, kind, fn, labelnames))
+
+    def render(self):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
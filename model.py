@@ -8,23 +8,155 @@ def set_parameter_requires_grad(model, feature_extracting):
         for param in model.parameters():
             param.requires_grad = False
 
+class TinyCNN(nn.Module):
+    """级联推理的第一级：四个卷积块，第一层即下采样，计算量约为 ResNet18（32x32 输入）的 1/10
+
+    简单图片由它直接给出结果，置信度不足的再交给 ResNet18
+    """
+
+    def __init__(self, num_classes, width=16):
+        super().__init__()
+
+        def block(in_channels, out_channels, stride=1):
+            return [
+                nn.Conv2d(in_channels, out_channels, 3, stride=stride, padding=1, bias=False),
+                nn.BatchNorm2d(out_channels),
+                nn.ReLU(inplace=True),
+            ]
+
+        self.features = nn.Sequential(
+            # 32x32 -> 16x16
+            *block(3, width, stride=2), *block(width, width * 2),
+            # 16x16 -> 8x8
+            nn.MaxPool2d(2), *block(width * 2, width * 4),
+            # 8x8 -> 4x4
+            nn.MaxPool2d(2), *block(width * 4, width * 8),
+            nn.AdaptiveAvgPool2d(1),
+        )
+        self.fc = nn.Linear(width * 8, num_classes)
+
+    def forward(self, x):
+        return self.fc(self.features(x).flatten(1))
+
+
+class BasicBlock(nn.Module):
+    """CIFAR ResNet 的残差块：两个 3x3 卷积；尺寸或通道数变化时捷径分支用 1x1 卷积对齐"""
+
+    def __init__(self, in_channels, out_channels, stride=1):
+        super().__init__()
+        self.conv1 = nn.Conv2d(in_channels, out_channels, 3, stride=stride, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(out_channels)
+        self.conv2 = nn.Conv2d(out_channels, out_channels, 3, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(out_channels)
+        self.relu = nn.ReLU(inplace=True)
+        self.shortcut = nn.Sequential()
+        if stride != 1 or in_channels != out_channels:
+            self.shortcut = nn.Sequential(
+                nn.Conv2d(in_channels, out_channels, 1, stride=stride, bias=False),
+                nn.BatchNorm2d(out_channels),
+            )
+
+    def forward(self, x):
+        out = self.relu(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        return self.relu(out + self.shortcut(x))
+
+
+class CifarResNet(nn.Module):
+    """为 32x32 输入设计的 ResNet（He et al. 2016 的 CIFAR 版本）
+
+    3x3 stem 不下采样，三个阶段分别为 32x32/16x16/8x8、16/32/64 通道，深度 = 6n + 2
+    （ResNet-20: n=3，ResNet-56: n=9）；ImageNet 版 ResNet18 在第一层就把 32x32 缩到 16x16，
+    最后一个阶段只剩 1x1，大部分计算浪费在几乎没有空间信息的特征图上
+    """
+
+    def __init__(self, depth, num_classes):
+        super().__init__()
+        if (depth - 2) % 6 != 0:
+            raise ValueError(f"CIFAR ResNet 的深度必须是 6n+2，收到 {depth}")
+        blocks = (depth - 2) // 6
+        self.conv1 = nn.Conv2d(3, 16, 3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(16)
+        self.relu = nn.ReLU(inplace=True)
+        layers, in_channels = [], 16
+        for out_channels, stride in ((16, 1), (32, 2), (64, 2)):
+            for index in range(blocks):
+                layers.append(BasicBlock(in_channels, out_channels, stride if index == 0 else 1))
+                in_channels = out_channels
+        self.layers = nn.Sequential(*layers)
+        self.avgpool = nn.AdaptiveAvgPool2d(1)
+        self.fc = nn.Linear(64, num_classes)
+        for module in self.modules():
+            if isinstance(module, nn.Conv2d):
+                nn.init.kaiming_normal_(module.weight, mode='fan_out', nonlinearity='relu')
+
+    def forward(self, x):
+        x = self.layers(self.relu(self.bn1(self.conv1(x))))
+        return self.fc(self.avgpool(x).flatten(1))
+
+
+def _resnet18(num_classes, use_pretrained=False):
+    model = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1 if use_pretrained else None)
+    # 替换分类层（添加 Dropout 防止过拟合）
+    # 原始的Resnet18的输入特征数为512，修改为10
+    num_ftrs = model.fc.in_features
+    model.fc = nn.Sequential(
+        # 防止过拟合，50%的概率丢掉神经元
+        nn.Dropout(0.5),
+        # 替换输出的的维度
+        nn.Linear(num_ftrs, num_classes))
+    return model
+
+
+def _mobilenet_v3_small(num_classes, use_pretrained=False):
+    """MobileNetV3-small：stem 与第一个倒残差块改为 stride=1，总下采样 8 倍，最后的特征图为 4x4"""
+    model = models.mobilenet_v3_small(weights=None, num_classes=num_classes)
+    for block in (model.features[0], model.features[1]):
+        for module in block.modules():
+            if isinstance(module, nn.Conv2d) and module.stride == (2, 2):
+                module.stride = (1, 1)
+    return model
+
+
+def _shufflenet_v2(num_classes, use_pretrained=False):
+    """ShuffleNetV2 1.0x：去掉 stem 的下采样和最大池化，总下采样 8 倍，最后的特征图为 4x4"""
+    model = models.shufflenet_v2_x1_0(weights=None, num_classes=num_classes)
+    model.conv1[0].stride = (1, 1)
+    model.maxpool = nn.Identity()
+    return model
+
+
+# 模型注册表：名称 -> 构建函数 (num_classes, use_pretrained) -> nn.Module
+# 只有 resnet18 使用 ImageNet 预训练权重，其余为 CIFAR 结构，从头训练
+# 检查点中的 model_name 字段对应这里的名称，服务端据此构建网络结构
+model_registry = {
+    'resnet18': _resnet18,
+    'tiny_cnn': lambda num_classes, use_pretrained=False: TinyCNN(num_classes),
+    'resnet20': lambda num_classes, use_pretrained=False: CifarResNet(20, num_classes),
+    'resnet56': lambda num_classes, use_pretrained=False: CifarResNet(56, num_classes),
+    'mobilenet_v3_small': _mobilenet_v3_small,
+    'shufflenet_v2': _shufflenet_v2,
+}
+
+
+def build_model(model_name, num_classes, use_pretrained=False):
+    """按名称构建网络结构（不移动设备、不冻结参数）"""
+    if model_name not in model_registry:
+        raise ValueError(f"未知的模型: {model_name}（可选 {', '.join(model_registry)}）")
+    return model_registry[model_name](num_classes, use_pretrained)
+
+
 def initialize_model(model_name, num_classes, feature_extract=True, use_pretrained=True):
-    """初始化 ResNet18 模型并修改分类头"""
-    if model_name == "resnet18":
-        model = models.resnet18(pretrained=use_pretrained)
-        # 冻结，不更新参数
-        set_parameter_requires_grad(model, feature_extract)
-
-        # 替换分类层（添加 Dropout 防止过拟合）
-        # 原始的Resnet18的输入特征数为512，修改为10
-        num_ftrs = model.fc.in_features
-        model.fc = nn.Sequential(
-            # 防止过拟合，50%的概率丢掉神经元
-            nn.Dropout(0.5),
-            # 替换输出的的维度
-            nn.Linear(num_ftrs, num_classes))
-        model = model.to(device)
-        return model
-    else:
-        print("Invalid model name!")
-        exit()
\ No newline at end of file
+    """初始化训练用的模型
+
+    resnet18 加载 ImageNet 预训练权重，feature_extract 时只训练新的分类层；
+    其余注册表中的模型从头训练，忽略 feature_extract 和 use_pretrained
+    """
+    if model_name != "resnet18":
+        return build_model(model_name, num_classes).to(device)
+    model = build_model(model_name, num_classes, use_pretrained)
+    # 冻结，不更新参数（新的分类层除外）
+    set_parameter_requires_grad(model, feature_extract)
+    for param in model.fc.parameters():
+        param.requires_grad = True
+    return model.to(device)
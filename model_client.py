@@ -0,0 +1,104 @@
+import json
+import asyncio
+import itertools
+from model_protocol import (
+    read_frame, pack_request, unpack_response, SIMILAR_HEADER, ITEM_ID,
+    OP_PREDICT, OP_STATUS, OP_SIMILAR, OP_SIMILAR_IMAGE, STATUS_OK, STATUS_BUSY, STATUS_MISSING,
+)
+
+
+class ModelClient:
+    """web worker 侧的模型服务客户端
+
+    每个 worker 进程保持一条到模型服务的长连接，请求带 id 并发发送，
+    后台任务按 id 把响应分发给对应的等待者；连接断开后下一次请求自动重连。
+    """
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _ensure_connected(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                raise ConnectionError(f"无法连接模型服务 {self.socket_path}: {e}") from e
+            self._writer = writer
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_responses(reader, writer))
+
+    async def _read_responses(self, reader, writer):
+        error = ConnectionError("模型服务连接已关闭")
+        try:
+            while True:
+                request_id, status, confidence, version, data = unpack_response(await read_frame(reader))
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, confidence, version, data))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            error = ConnectionError(f"模型服务连接中断: {e}")
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            # 连接已断开，所有未完成的请求一起失败
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _request(self, op, data=b''):
+        await self._ensure_connected()
+        request_id = next(self._ids) % 0x100000000
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(pack_request(request_id, op, data))
+            await self._writer.drain()
+            status, confidence, version, payload = await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+        if status == STATUS_BUSY:
+            raise asyncio.QueueFull(payload.decode('utf-8'))
+        if status == STATUS_MISSING:
+            raise FileNotFoundError(payload.decode('utf-8'))
+        if status != STATUS_OK:
+            raise RuntimeError(payload.decode('utf-8'))
+        return confidence, version, payload
+
+    async def predict(self, image_tensor):
+        """发送预处理后的 3x32x32 张量，返回 (类别, 置信度, 模型版本)"""
+        data = image_tensor.contiguous().float().numpy().tobytes()
+        confidence, version, payload = await self._request(OP_PREDICT, data)
+        return payload.decode('utf-8'), round(confidence, 2), version
+
+    async def similar(self, image_tensor, k):
+        """相似图片检索：返回 [{'id', 'class', 'score'}]；索引未生成时抛出 FileNotFoundError"""
+        data = SIMILAR_HEADER.pack(k) + image_tensor.contiguous().float().numpy().tobytes()
+        _, _, payload = await self._request(OP_SIMILAR, data)
+        return json.loads(payload)
+
+    async def similar_image_path(self, item_id):
+        """训练集图片编号 -> 文件路径（模型服务与 web worker 在同一台机器上）；编号无效时返回 None"""
+        _, _, payload = await self._request(OP_SIMILAR_IMAGE, ITEM_ID.pack(item_id))
+        return payload.decode('utf-8') or None
+
+    async def status(self):
+        """模型服务的就绪状态、冷启动报告与当前模型版本"""
+        _, _, payload = await self._request(OP_STATUS)
+        return json.loads(payload)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
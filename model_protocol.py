@@ -0,0 +1,66 @@
+import struct
+
+# 模型服务进程与 web worker 之间的二进制协议（Unix 域套接字）
+# 每帧 = 4 字节大端长度 + 负载；同一连接上可以并发多个请求，响应按请求 id 对应，不保证顺序
+#
+# 请求负载: 请求 id (u32) | 操作码 (u8) | 数据
+#   OP_PREDICT 数据为预处理后 3x32x32 张量的 float32 原始字节（小端，12288 字节）
+#   OP_STATUS  无数据
+#   OP_SIMILAR k (u16) + 预处理后张量的 float32 原始字节，检索训练集中最相似的 k 张图片
+#   OP_SIMILAR_IMAGE 训练集图片编号 (u32)
+# 响应负载: 请求 id (u32) | 状态码 (u8) | 置信度 (f32) | 模型版本 (12 字节 ASCII) | 数据
+#   STATUS_OK    预测时数据为 UTF-8 类别名；查询状态与相似检索时为 JSON；图片编号查询时为 UTF-8 文件路径（编号无效时为空）
+#   STATUS_ERROR 数据为 UTF-8 错误信息
+#   STATUS_BUSY  推理队列已满或排队超时，数据为 UTF-8 错误信息，客户端可稍后重试
+#   STATUS_MISSING 所需的离线产物（如相似图片索引）未生成，数据为 UTF-8 错误信息
+
+FRAME_HEADER = struct.Struct('!I')
+REQUEST_HEADER = struct.Struct('!IB')
+RESPONSE_HEADER = struct.Struct('!IBf12s')
+SIMILAR_HEADER = struct.Struct('!H')
+ITEM_ID = struct.Struct('!I')
+
+OP_PREDICT = 1
+OP_STATUS = 2
+OP_SIMILAR = 3
+OP_SIMILAR_IMAGE = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_BUSY = 2
+STATUS_MISSING = 3
+
+# 单张输入张量的字节数与单帧上限（防止错误的长度字段导致分配巨大内存）
+TENSOR_BYTES = 3 * 32 * 32 * 4
+MAX_FRAME_BYTES = 1024 * 1024
+
+
+def pack_frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader):
+    """读取一帧并返回负载；对端关闭时抛出 asyncio.IncompleteReadError"""
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"帧长度 {length} 超过上限 {MAX_FRAME_BYTES}")
+    return await reader.readexactly(length)
+
+
+def pack_request(request_id, op, data=b''):
+    return pack_frame(REQUEST_HEADER.pack(request_id, op) + data)
+
+
+def unpack_request(payload):
+    request_id, op = REQUEST_HEADER.unpack_from(payload)
+    return request_id, op, payload[REQUEST_HEADER.size:]
+
+
+def pack_response(request_id, status, confidence=0.0, data=b'', version=''):
+    header = RESPONSE_HEADER.pack(request_id, status, confidence, version.encode('ascii'))
+    return pack_frame(header + data)
+
+
+def unpack_response(payload):
+    request_id, status, confidence, version = RESPONSE_HEADER.unpack_from(payload)
+    return request_id, status, confidence, version.rstrip(b'\0').decode('ascii'), payload[RESPONSE_HEADER.size:]
@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+import argparse
+import serve_config
+import inference
+from batcher import InferenceBatcher
+from metrics import Histogram, batch_size_buckets
+from model_protocol import (
+    read_frame, unpack_request, pack_response, SIMILAR_HEADER, ITEM_ID,
+    OP_PREDICT, OP_STATUS, OP_SIMILAR, OP_SIMILAR_IMAGE, STATUS_OK, STATUS_ERROR, STATUS_BUSY, STATUS_MISSING,
+    TENSOR_BYTES,
+)
+
+# 独立的模型服务进程：唯一持有模型权重和批处理队列
+# app.py 的各个 web worker 在本地完成解码与预处理，把 3x32x32 张量经 Unix 域套接字发送过来
+# 来自所有 worker 的请求在这里合并成批次，增加 web worker 不会增加模型内存
+# 相似图片检索（特征提取器与向量索引）同样只在这里加载
+# 用法: python model_server.py --socket /tmp/animal_model.sock
+#       SERVE_MODEL_SERVER_SOCKET=/tmp/animal_model.sock python prefork.py --workers 8
+
+
+class ModelServer:
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.executor = inference.create_executor('thread', serve_config.executor_workers)
+        self.batcher = InferenceBatcher(
+            inference.predict_batch,
+            max_batch_size=serve_config.max_batch_size,
+            max_wait_ms=serve_config.max_wait_ms,
+            executor=self.executor,
+            max_queue=serve_config.max_queue_depth,
+            queue_timeout_ms=serve_config.request_timeout_s * 1000,
+            observer=self._observe_batch,
+        )
+        self.similar_batcher = InferenceBatcher(
+            inference.similar_batch,
+            max_batch_size=serve_config.max_batch_size,
+            max_wait_ms=serve_config.max_wait_ms,
+            executor=self.executor,
+            max_queue=serve_config.max_queue_depth,
+            queue_timeout_ms=serve_config.request_timeout_s * 1000,
+        )
+        self.report = {'ready': False}
+        # 批次统计只在这里产生：随 OP_STATUS 返回，由 web worker 的 /metrics 导出
+        self.batch_size = Histogram('animal_batch_size', '推理批次大小', buckets=batch_size_buckets)
+        self.queue_wait = Histogram('animal_batch_queue_wait_seconds', '请求在批处理队列中的等待时间（秒）')
+        self.forward = Histogram('animal_batch_forward_seconds', '批次前向传播耗时（秒）')
+
+    def _observe_batch(self, batch_size, waits, compute_s):
+        self.batch_size.observe(batch_size)
+        for wait in waits:
+            self.queue_wait.observe(wait)
+        self.forward.observe(compute_s)
+
+    def batch_stats(self):
+        return {'batch_size': self.batch_size.export(), 'queue_wait': self.queue_wait.export(),
+                'forward': self.forward.export()}
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # 模型服务以分类为主，相似图片索引在第一次 OP_SIMILAR 时才加载，不使用检索的部署不占启动时间与内存
+        self.report = await loop.run_in_executor(self.executor, inference.startup, serve_config.warmup_passes, False)
+        if not self.report.get('ready'):
+            raise RuntimeError(f"模型加载失败: {self.report.get('error')}")
+        self.batcher.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_connection, path=self.socket_path)
+        print(f"模型服务已启动: {self.socket_path}，冷启动耗时 {self.report.get('total_s')}s")
+        return server
+
+    async def handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(frame):
+            async with write_lock:
+                writer.write(frame)
+                await writer.drain()
+
+        async def handle_request(request_id, op, data):
+            try:
+                if op == OP_PREDICT:
+                    pred_class, confidence, version = await self.batcher.submit(_tensor_from_bytes(data))
+                    frame = pack_response(request_id, STATUS_OK, confidence, pred_class.encode('utf-8'), version)
+                elif op == OP_SIMILAR:
+                    (k,) = SIMILAR_HEADER.unpack_from(data)
+                    neighbors = await self.similar_batcher.submit((_tensor_from_bytes(data[SIMILAR_HEADER.size:]), k))
+                    frame = pack_response(request_id, STATUS_OK, data=json.dumps(neighbors).encode('utf-8'))
+                elif op == OP_SIMILAR_IMAGE:
+                    (item_id,) = ITEM_ID.unpack(data)
+                    path = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, inference.similar_image_path, item_id)
+                    frame = pack_response(request_id, STATUS_OK, data=(path or '').encode('utf-8'))
+                elif op == OP_STATUS:
+                    status = dict(self.report, model=inference.get_model_info(), queue=self.batcher.stats(),
+                                  batches=self.batch_stats())
+                    frame = pack_response(request_id, STATUS_OK, data=json.dumps(status).encode('utf-8'))
+                else:
+                    raise ValueError(f"未知操作码: {op}")
+            except (asyncio.QueueFull, asyncio.TimeoutError) as e:
+                # 过载：web worker 收到后返回 429 / 503，而不是 500
+                message = str(e) or "推理队列已满"
+                frame = pack_response(request_id, STATUS_BUSY, data=message.encode('utf-8'))
+            except FileNotFoundError as e:
+                frame = pack_response(request_id, STATUS_MISSING, data=str(e).encode('utf-8'))
+            except Exception as e:
+                frame = pack_response(request_id, STATUS_ERROR, data=str(e).encode('utf-8'))
+            await respond(frame)
+
+        try:
+            while True:
+                request_id, op, data = unpack_request(await read_frame(reader))
+                task = asyncio.get_running_loop().create_task(handle_request(request_id, op, data))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            print(f"协议错误，断开连接: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def stop(self):
+        await self.batcher.stop()
+        await self.similar_batcher.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def _tensor_from_bytes(data):
+    import torch
+    if len(data) != TENSOR_BYTES:
+        raise ValueError(f"输入张量应为 {TENSOR_BYTES} 字节，实际 {len(data)} 字节")
+    return torch.frombuffer(bytearray(data), dtype=torch.float32).view(3, 32, 32)
+
+
+async def serve(socket_path):
+    model_server = ModelServer(socket_path)
+    server = await model_server.start()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await model_server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='独立模型服务进程（Unix 域套接字）')
+    parser.add_argument('--socket', default=serve_config.model_server_socket or '/tmp/animal_model.sock')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.socket))
+    except KeyboardInterrupt:
+        pass
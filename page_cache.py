@@ -0,0 +1,222 @@
+import os
+import html
+import hashlib
+from collections import OrderedDict
+from email.utils import formatdate
+from fastapi.responses import Response
+from compression import choose_encodings, compress, encoded_etag, not_modified
+
+# 页面缓存：启动时把 All_html/ 下的页面全部读入内存，预先计算 ETag 与 Last-Modified
+# 条件请求（If-None-Match / If-Modified-Since）命中时直接返回 304，不再发送页面内容
+# 源文件是否修改由后台线程定期 scan()（读取与改写页面都在线程中），结果经 apply() 在事件循环中替换；
+# 请求路径上只查表，不访问磁盘
+# 加载时同时压缩为 gzip（及 br，需安装 brotli）保存在内存中，按 Accept-Encoding 发送
+# 可以为页面指定一个可替换区域（slot，如导航栏的登录状态），按请求填入内容，其余部分沿用预先切分好的模板
+# 页面表只在事件循环线程中修改，不需要加锁
+
+# 页面响应的缓存策略：浏览器可以缓存，但每次使用前都要向服务器确认（条件请求）
+cache_control = 'no-cache'
+# 已填充可替换区域的页面（按页面与 ETag）缓存的条数：同一用户反复访问时不必重新拼接与压缩
+filled_cache_size = 128
+
+
+class Page:
+    __slots__ = ('body', 'etag', 'last_modified', 'mtime', 'signature', 'parts', 'variants',
+                 'version', 'slot_parts')
+
+    def __init__(self, body, stat, marker=None, version=None, slot=None):
+        self.body = body
+        self.version = version
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.mtime = int(stat.st_mtime)
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        # 预编译的模板：页面在 marker 处切开，渲染时只需拼接
+        self.parts = body.split(marker) if marker else None
+        # 可替换区域：(区域之前, 区域之后)；页面中没有该区域时为 None
+        self.slot_parts = _split_slot(body, slot) if slot else None
+        # 编码 -> 压缩后的页面；带插入内容的渲染结果不在这里，由 GZipFallback 中间件即时压缩
+        self.variants = compressed_variants(body)
+
+
+class PageCache:
+    def __init__(self, directory, markers=None, transform=None, depends_on=None, slot=None):
+        """markers: {文件名: 切分位置}，这些页面可以用 render() 在切分位置前插入内容；
+        slot: (开始标记, 结束标记)，页面中开始标记所在标签与其后第一个结束标记之间的内容可以用 fill_slot() 替换；
+        transform(文件名, 页面字节) -> 页面字节，在加载时对页面做一次改写（如响应式图片、指纹 URL）；
+        depends_on() -> 版本号，变化时重新读取并改写页面（改写结果依赖的静态资源清单）"""
+        self.directory = directory
+        self.transform = transform
+        self.depends_on = depends_on
+        self.slot = tuple(marker.encode('utf-8') for marker in slot) if slot else None
+        self.markers = {name: marker.encode('utf-8') for name, marker in (markers or {}).items()}
+        self._pages = {}
+        self.hits = 0
+        self.reloads = 0
+        self.not_modified = 0
+        self._filled = OrderedDict()
+
+    def load_all(self):
+        """启动时预加载目录下全部 .html 页面，返回页面数"""
+        for name in self._names():
+            self._pages[name] = self._load(name)
+        return len(self._pages)
+
+    def _names(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.html'))
+
+    def _load(self, name):
+        """读取并改写一个页面（可能解码图片），在线程中调用"""
+        path = os.path.join(self.directory, name)
+        with open(path, 'rb') as f:
+            body = f.read()
+            stat = os.fstat(f.fileno())
+        version = self.depends_on() if self.depends_on is not None else None
+        if self.transform is not None:
+            body = self.transform(name, body)
+        return Page(body, stat, self.markers.get(name), version, self.slot)
+
+    def scan(self):
+        """在后台线程中调用：重新读取新增、修改或依赖版本变化的页面，返回 [(文件名, 新的 Page 或 None 表示已删除)]，
+        不修改页面表"""
+        changes = []
+        version = self.depends_on() if self.depends_on is not None else None
+        names = self._names()
+        for name in names:
+            page = self._pages.get(name)
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+                if page is None or (stat.st_mtime_ns, stat.st_size) != page.signature or version != page.version:
+                    changes.append((name, self._load(name)))
+            except FileNotFoundError:
+                changes.append((name, None))
+        changes.extend((name, None) for name in set(self._pages) - set(names))
+        return changes
+
+    def apply(self, changes):
+        """在事件循环中调用：把 scan() 的结果写回页面表"""
+        for name, page in changes:
+            if page is None:
+                self._pages.pop(name, None)
+            else:
+                self._pages[name] = page
+            self.reloads += 1
+
+    def get(self, name):
+        """返回缓存中的页面（不访问磁盘）；页面不存在时抛出 FileNotFoundError"""
+        page = self._pages.get(name)
+        if page is None:
+            raise FileNotFoundError(os.path.join(self.directory, name))
+        self.hits += 1
+        return page
+
+    def response(self, request, name):
+        page = self.get(name)
+        encoding = _choose_encoding(request, page.variants)
+        body = page.variants[encoding] if encoding else page.body
+        return self._respond(request, body, page.etag, page, encoding)
+
+    def render(self, request, name, insert):
+        """在预编译模板的每个切分位置前插入 insert（调用方负责转义），ETag 随插入内容变化"""
+        page = self.get(name)
+        if not insert:
+            # 不插入内容时页面不变，发送预先压缩的版本
+            encoding = _choose_encoding(request, page.variants)
+            return self._respond(request, page.variants[encoding] if encoding else page.body, page.etag, page, encoding)
+        insert = insert.encode('utf-8')
+        marker = self.markers[name]
+        body = (insert + marker).join(page.parts)
+        etag = page.etag[:-1] + '-' + hashlib.blake2b(insert, digest_size=6).hexdigest() + '"'
+        return self._respond(request, body, etag, page)
+
+    def fill_slot(self, request, name, fragment):
+        """可替换区域换成 fragment（调用方负责转义）；页面没有该区域或 fragment 为空时与 response() 相同
+
+        结果因请求而异（如登录用户），Cache-Control 为 private，ETag 随 fragment 变化；
+        最近的 filled_cache_size 个结果连同压缩版本缓存在内存中
+        """
+        page = self.get(name)
+        if not fragment or page.slot_parts is None:
+            return self.response(request, name)
+        fragment = fragment.encode('utf-8')
+        etag = page.etag[:-1] + '-' + hashlib.blake2b(fragment, digest_size=6).hexdigest() + '"'
+        key = (name, etag)
+        filled = self._filled.get(key)
+        if filled is None:
+            before, after = page.slot_parts
+            body = before + fragment + after
+            filled = self._filled[key] = (body, compressed_variants(body))
+            if len(self._filled) > filled_cache_size:
+                self._filled.popitem(last=False)
+        else:
+            self._filled.move_to_end(key)
+        body, variants = filled
+        encoding = _choose_encoding(request, variants)
+        return self._respond(request, variants[encoding] if encoding else body, etag, page, encoding, private=True)
+
+    def _respond(self, request, body, etag, page, encoding=None, private=False):
+        headers = {'ETag': encoded_etag(etag, encoding), 'Last-Modified': page.last_modified,
+                   'Cache-Control': 'private, ' + cache_control if private else cache_control,
+                   # 带可替换区域的页面内容取决于 Cookie（登录状态）
+                   'Vary': 'Accept-Encoding, Cookie' if page.slot_parts else 'Accept-Encoding'}
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        if request is not None and not_modified(request.headers, etag, page.mtime):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type='text/html; charset=utf-8', headers=headers)
+
+    def stats(self):
+        return {'pages': len(self._pages), 'hits': self.hits, 'reloads': self.reloads,
+                'not_modified': self.not_modified}
+
+
+def compressed_variants(body):
+    """编码 -> 压缩后的页面；压缩后不更小的编码不保留"""
+    variants = {}
+    for encoding in ('br', 'gzip'):
+        compressed = compress(body, encoding)
+        if compressed is not None and len(compressed) < len(body):
+            variants[encoding] = compressed
+    return variants
+
+
+def _choose_encoding(request, variants):
+    if request is None or not variants:
+        return None
+    return next(iter(choose_encodings(request.headers.get('accept-encoding'), variants)), None)
+
+
+def _split_slot(body, slot):
+    start_marker, end_marker = slot
+    start = body.find(start_marker)
+    if start < 0:
+        return None
+    start = body.find(b'>', start) + 1
+    end = body.find(end_marker, start)
+    if start == 0 or end < 0:
+        return None
+    return body[:start], body[end:]
+
+
+def hidden_field(name, value):
+    """表单隐藏域，name 和 value 都做 HTML 转义"""
+    return f'\n<input type="hidden" name="{html.escape(name)}" value="{html.escape(value)}">\n'
+
+
+def nav_user_box(username):
+    """导航栏的已登录状态（与 global_nav.js 中的客户端渲染相同），用户名做 HTML 转义"""
+    initial = html.escape(username[:1] or 'U')
+    username = html.escape(username)
+    return f"""
+          <div class="nav-user-box" style="display:flex;align-items:center;gap:10px;">
+            <div class="avatar" style="width:32px;height:32px;border-radius:50%;background:linear-gradient(135deg,#3bc9db,#845ef7);display:flex;align-items:center;justify-content:center;color:#fff;font-weight:600;">
+              {initial}
+            </div>
+            <div class="user-info" style="display:flex;flex-direction:column;line-height:1.2;">
+              <span style="font-weight:600;color:#1f2937;">欢迎，{username}</span>
+              <span style="font-size:12px;color:#6b7280;">已登录</span>
+            </div>
+            <a class="nav-btn" href="/logout" style="margin-left:6px;">退出</a>
+          </div>
+        """
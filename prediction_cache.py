@@ -0,0 +1,123 @@
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU + TTL 缓存：超过 maxsize 时淘汰最久未使用的条目，超过 ttl 秒的条目视为失效"""
+
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class PredictionCache:
+    """两级预测缓存
+
+    第一级以上传原始字节的哈希为键，命中时连解码都省掉；
+    第二级以量化后 32x32 输入张量的哈希为键，不同编码的同一张图也能命中，省掉前向传播。
+    相同键的并发请求只计算一次（single-flight），其余请求共享结果。
+    结果的最后一项是模型版本：结果的版本与缓存中的不同时两级缓存一起清空，只保留当前版本的结果。
+    不记录淘汰过的版本，回滚到旧版本后缓存照常工作；替换时已在计算中的旧版本结果
+    最多让缓存多清空一两次，不会长期混入不同版本的结果。
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        self.bytes_tier = TTLCache(maxsize, ttl)
+        self.tensor_tier = TTLCache(maxsize, ttl)
+        self.coalesced = 0
+        self.version = None
+        self._inflight = {}
+
+    def observe_version(self, version):
+        """记录新结果的模型版本，版本变化时清空缓存"""
+        if version == self.version:
+            return
+        if self.version is not None:
+            self.clear()
+        self.version = version
+
+    async def predict(self, contents, preprocess, infer):
+        """preprocess(contents) -> (张量, 张量键)，infer(张量) -> 结果，两者都是协程函数"""
+        bytes_key = hashlib.sha256(contents).hexdigest()
+        result = self.bytes_tier.get(bytes_key)
+        if result is not None:
+            return result
+        return await self._single_flight(
+            ('bytes', bytes_key), lambda: self._decode_and_infer(contents, bytes_key, preprocess, infer))
+
+    async def _decode_and_infer(self, contents, bytes_key, preprocess, infer):
+        image_tensor, tensor_key = await preprocess(contents)
+        result = self.tensor_tier.get(tensor_key)
+        if result is None:
+            result = await self._single_flight(
+                ('tensor', tensor_key), lambda: self._infer(image_tensor, tensor_key, infer))
+        if result[-1] == self.version:
+            self.bytes_tier.set(bytes_key, result)
+        return result
+
+    async def _infer(self, image_tensor, tensor_key, infer):
+        result = await infer(image_tensor)
+        self.observe_version(result[-1])
+        self.tensor_tier.set(tensor_key, result)
+        return result
+
+    async def _single_flight(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            # 计算放在独立任务中：发起请求的客户端断开也不影响其他等待者
+            task = asyncio.get_running_loop().create_task(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        # 所有等待者都已断开时也要取走异常，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def clear(self):
+        self.bytes_tier.clear()
+        self.tensor_tier.clear()
+
+    def stats(self):
+        return {
+            "bytes": self.bytes_tier.stats(),
+            "tensor": self.tensor_tier.stats(),
+            "coalesced": self.coalesced,
+            "model_version": self.version,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+
+# 预派生（pre-fork）多进程启动器
+# 父进程只加载一次模型，把权重张量移到共享内存，再 fork 出多个 uvicorn worker 共享同一份权重；
+# 每个 worker 限制 torch 线程数，避免多个 worker 的算子线程互相抢占 CPU 核
+# 用法: python prefork.py --workers 4 --port 8000 --report-after 15
+#       python prefork.py --workers 4 --no-share   # 对照：每个 worker 各自加载模型（等同 uvicorn --workers）
+
+# fork 只能与线程池执行器配合：进程池会在每个 worker 里再各自加载模型
+os.environ['SERVE_EXECUTOR'] = 'thread'
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+
+def process_memory(pid):
+    """读取 /proc/<pid>/smaps_rollup，返回以 MB 为单位的 RSS / PSS / 共享 / 私有内存"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {'rss': fields.get('Rss', 0), 'pss': fields.get('Pss', 0), 'shared': shared, 'private': private}
+
+
+def print_memory_report(pids):
+    print(f'\n{"worker pid":<12}{"RSS MB":>10}{"PSS MB":>10}{"shared MB":>12}{"private MB":>12}')
+    total_pss = 0.0
+    for pid in pids:
+        try:
+            memory = process_memory(pid)
+        except OSError:
+            continue
+        total_pss += memory['pss']
+        print(f'{pid:<12}{memory["rss"]:>10.1f}{memory["pss"]:>10.1f}'
+              f'{memory["shared"]:>12.1f}{memory["private"]:>12.1f}')
+    parent = process_memory(os.getpid())
+    print(f'{"parent":<12}{parent["rss"]:>10.1f}{parent["pss"]:>10.1f}'
+          f'{parent["shared"]:>12.1f}{parent["private"]:>12.1f}')
+    print(f'workers 总 PSS: {total_pss:.1f} MB（PSS 把共享页平摊到各进程，是实际占用的内存）\n')
+
+
+def share_weights(model):
+    """把模型参数和 buffer 移到共享内存；fork 后各 worker 直接映射同一份物理页"""
+    import torch
+    module = getattr(model, 'model', model)
+    if not isinstance(module, torch.nn.Module):
+        print(f'{type(model).__name__} 不是 nn.Module，权重依赖 fork 的写时复制共享')
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    for tensor in tensors:
+        tensor.share_memory_()
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def run_worker(app, sock, torch_threads):
+    """子进程：限制 torch 线程数后在继承来的监听 socket 上运行 uvicorn"""
+    import torch
+    import uvicorn
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    torch.set_num_threads(torch_threads)
+    server = uvicorn.Server(uvicorn.Config(app, lifespan='on'))
+    server.run(sockets=[sock])
+
+
+def spawn_worker(app, sock, torch_threads):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, torch_threads)
+        except BaseException as e:
+            print(f'worker {os.getpid()} 异常退出: {e}')
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预派生多进程启动器（worker 共享模型权重）')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help='每个 worker 的 torch 算子线程数（默认 CPU 核数 / workers）')
+    parser.add_argument('--no-share', action='store_true', help='对照组：每个 worker 在 fork 后各自加载模型')
+    parser.add_argument('--report-after', type=float, default=None, help='启动若干秒后打印各 worker 的内存占用')
+    args = parser.parse_args()
+
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    import torch
+    # 父进程不开启算子线程池：fork 已初始化 OpenMP 线程池的进程，子进程可能死锁
+    torch.set_num_threads(1)
+    import app as app_module
+    import inference
+    import serve_config
+
+    if serve_config.model_server_socket:
+        # 权重由独立的 model_server.py 持有，worker 只做预处理
+        print(f'使用独立模型服务: {serve_config.model_server_socket}')
+    elif not args.no_share:
+        start = time.perf_counter()
+        if not inference.ensure_model_loaded():
+            print(f'模型加载失败: {inference.startup_report.get("error")}')
+            sys.exit(1)
+        if inference.device.type != 'cpu':
+            print('pre-fork 共享权重只支持 CPU 推理（CUDA 上下文不能跨 fork 使用）')
+            sys.exit(1)
+        shared_bytes = share_weights(inference._model)
+        print(f'父进程加载模型 {time.perf_counter() - start:.2f}s，共享权重 {shared_bytes / 1024 / 1024:.1f} MB')
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers = set()
+    for _ in range(args.workers):
+        workers.add(spawn_worker(app_module.app, sock, torch_threads))
+    print(f'{args.workers} 个 worker 已启动，每个 torch 线程数 {torch_threads}，监听 {args.host}:{args.port}')
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    started = time.monotonic()
+    reported = args.report_after is None
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if not reported and time.monotonic() - started >= args.report_after:
+                print_memory_report(sorted(workers))
+                reported = True
+            time.sleep(0.5)
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f'worker {pid} 退出（状态 {status}），重新派生')
+            workers.add(spawn_worker(app_module.app, sock, torch_threads))
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+import argparse
+import torch
+from torch import nn
+from torchvision import datasets
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+import backends
+import serve_config
+from config import data_root, get_data_transforms
+from inference import load_classifier, weight_path
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 训练后量化（仅 CPU）：
+# int8    静态 INT8 量化，卷积和全连接全部量化，用 course_data/test 的一部分图片校准激活范围
+# dynamic 动态量化，只量化全连接层的权重，激活在运行时量化（ResNet18 的计算量几乎都在卷积里）
+# bf16 不需要导出，由 backends.Bf16Classifier 在推理时 autocast
+# 用法: python quantize_model.py --calibration-images 512
+
+# 量化后端：x86 服务器用 x86（fbgemm），ARM 用 qnnpack
+quantized_engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+
+
+def evaluation_loader(limit=None, batch_size=64, seed=42):
+    """course_data/test 的数据加载器；limit 指定时随机抽取固定的一部分图片"""
+    dataset = datasets.ImageFolder(
+        root=os.path.join(data_root, 'test'),
+        transform=get_data_transforms()['test']
+    )
+    if limit is not None and limit < len(dataset):
+        generator = torch.Generator().manual_seed(seed)
+        indices = torch.randperm(len(dataset), generator=generator)[:limit].tolist()
+        dataset = torch.utils.data.Subset(dataset, indices)
+    return torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=2)
+
+
+def quantize_static_int8(model, calibration_loader):
+    """FX 图模式静态量化：插入观察器 -> 跑校准数据 -> 转换为 INT8 算子"""
+    torch.backends.quantized.engine = quantized_engine
+    model = model.cpu().eval()
+    example = torch.randn(1, 3, 32, 32)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(quantized_engine), (example,))
+    with torch.no_grad():
+        for inputs, _ in calibration_loader:
+            prepared(inputs)
+    return convert_fx(prepared)
+
+
+def quantize_dynamic_int8(model):
+    torch.backends.quantized.engine = quantized_engine
+    return quantize_dynamic(model.cpu().eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def save_traced(model, path):
+    """量化模型以冻结的 TorchScript 保存，服务端用 torch.jit.load 加载"""
+    example = torch.randn(2, 3, 32, 32)
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(model, example).eval())
+    torch.jit.save(traced, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='训练后量化')
+    parser.add_argument('--weights', default=weight_path, help='训练得到的权重文件')
+    parser.add_argument('--artifact-dir', default=serve_config.artifact_dir, help='导出目录')
+    parser.add_argument('--calibration-images', type=int, default=512, help='校准用的测试集图片数')
+    args = parser.parse_args()
+
+    device = torch.device('cpu')
+    os.makedirs(args.artifact_dir, exist_ok=True)
+
+    print(f"静态 INT8 量化（{quantized_engine}），校准图片 {args.calibration_images} 张...")
+    int8_model = quantize_static_int8(load_classifier(args.weights, device), evaluation_loader(args.calibration_images))
+    save_traced(int8_model, backends.artifact_path('int8', args.artifact_dir))
+
+    print("动态量化...")
+    dynamic_model = quantize_dynamic_int8(load_classifier(args.weights, device))
+    save_traced(dynamic_model, backends.artifact_path('dynamic', args.artifact_dir))
+
+    for kind in ['int8', 'dynamic']:
+        print(f"{kind:<8} -> {backends.artifact_path(kind, args.artifact_dir)}")
+    print("精度与延迟对比: python benchmark_quantization.py")
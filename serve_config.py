@@ -0,0 +1,80 @@
+import os
+
+# 推理服务配置
+# 与训练配置 config.py 分开：这里不导入 torch，app.py 启动时即可读取
+# 所有参数均可通过同名的 SERVE_* 环境变量覆盖
+
+# 动态批处理：单个批次最多合并的请求数
+max_batch_size = int(os.environ.get('SERVE_MAX_BATCH_SIZE', 16))
+# 动态批处理：批次中第一个请求到达后，最多再等待多少毫秒凑批
+max_wait_ms = float(os.environ.get('SERVE_MAX_WAIT_MS', 5))
+
+# 推理执行器类型：thread（线程池，共享一份模型）或 process（进程池，每个进程一份模型）
+executor_kind = os.environ.get('SERVE_EXECUTOR', 'thread')
+# 推理执行器的 worker 数量
+executor_workers = int(os.environ.get('SERVE_EXECUTOR_WORKERS', 2))
+
+# 启动阶段预热：前向传播次数
+warmup_passes = int(os.environ.get('SERVE_WARMUP_PASSES', 3))
+
+# 预测缓存：每一级最多缓存的条目数（0 表示关闭缓存）
+prediction_cache_size = int(os.environ.get('SERVE_PREDICTION_CACHE_SIZE', 4096))
+# 预测缓存：条目有效期（秒）
+prediction_cache_ttl_s = float(os.environ.get('SERVE_PREDICTION_CACHE_TTL_S', 3600))
+
+# 单张上传图片的最大字节数
+max_upload_bytes = int(os.environ.get('SERVE_MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+# 单张图片的最大像素数（宽 x 高），超出时在解码前拒绝，防御解压炸弹
+max_image_pixels = int(os.environ.get('SERVE_MAX_IMAGE_PIXELS', 40_000_000))
+# 批量识别：同时在途（读取/解码/推理/等待输出）的图片数上限
+batch_max_inflight = int(os.environ.get('SERVE_BATCH_MAX_INFLIGHT', 64))
+
+# 分类模型的权重文件；网络结构由检查点中的 model_name 决定（见 model.model_registry）
+weights = os.environ.get('SERVE_WEIGHTS', 'cifar10_best.pt')
+
+# 页面缓存：后台检查 All_html/ 中页面源文件是否修改的间隔（秒），0 表示不检查
+page_check_interval_s = float(os.environ.get('SERVE_PAGE_CHECK_INTERVAL_S', 1))
+# 静态资源清单：后台检查资源文件是否修改、以及缓存 404 结果的间隔（秒），0 表示不检查修改、不缓存 404
+asset_check_interval_s = float(os.environ.get('SERVE_ASSET_CHECK_INTERVAL_S', 5))
+# 未预先压缩的 JSON / HTML 响应达到该字节数时即时 gzip 压缩
+gzip_min_bytes = int(os.environ.get('SERVE_GZIP_MIN_BYTES', 1024))
+
+# 推理后端：eager / torchscript / compile / onnx（后三种需先运行 export_model.py 导出）
+# CPU 低精度模式：int8 / dynamic（需先运行 quantize_model.py 导出）/ bf16
+backend = os.environ.get('SERVE_BACKEND', 'eager')
+# 导出产物所在目录
+artifact_dir = os.environ.get('SERVE_ARTIFACT_DIR', 'serving')
+
+# 响应式图片：缩略图缓存目录与总大小上限（字节），超出时淘汰最久未用的缩略图
+image_cache_dir = os.environ.get('SERVE_IMAGE_CACHE_DIR', os.path.join(artifact_dir, 'images'))
+image_cache_max_bytes = int(os.environ.get('SERVE_IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# 缩略图响应的缓存策略
+image_cache_control = os.environ.get('SERVE_IMAGE_CACHE_CONTROL', 'public, max-age=86400')
+
+# 独立模型服务的 Unix 域套接字路径；设置后 app.py 不再加载模型，推理请求发往 model_server.py
+model_server_socket = os.environ.get('SERVE_MODEL_SERVER_SOCKET', '')
+
+# 模型热更新：检查权重文件（或导出产物）是否有新版本的间隔秒数，0 表示关闭
+reload_interval_s = float(os.environ.get('SERVE_RELOAD_INTERVAL_S', 5))
+
+# 准入控制：同时处理中的 /api/predict 请求上限，超出时立即返回 429
+max_pending_requests = int(os.environ.get('SERVE_MAX_PENDING_REQUESTS', 64))
+# 单个预测请求的截止时间（秒），超时返回 503；批处理器中排队超过该时间的请求不再计算
+request_timeout_s = float(os.environ.get('SERVE_REQUEST_TIMEOUT_S', 10))
+# 推理批处理器的队列深度上限（0 表示不限），队列已满的请求立即被拒绝
+max_queue_depth = int(os.environ.get('SERVE_MAX_QUEUE_DEPTH', 256))
+# 拒绝响应中 Retry-After 头的秒数
+retry_after_s = int(os.environ.get('SERVE_RETRY_AFTER_S', 1))
+
+# 相似图片检索：索引类型 ivf（近似，只扫描最近的若干簇）或 exact（精确）
+similar_index = os.environ.get('SERVE_SIMILAR_INDEX', 'ivf')
+# ivf 查询时扫描的簇数，越大召回率越高、越慢
+similar_nprobe = int(os.environ.get('SERVE_SIMILAR_NPROBE', 8))
+# /api/similar 单次最多返回的相似图片数
+similar_max_k = int(os.environ.get('SERVE_SIMILAR_MAX_K', 50))
+
+# 级联推理：小模型（train_cascade.py 训练并校准）置信度够高时直接返回，否则再交给主模型
+cascade = os.environ.get('SERVE_CASCADE', '0') == '1'
+cascade_weights = os.environ.get('SERVE_CASCADE_WEIGHTS', 'cifar10_tiny.pt')
+# 置信度阈值，留空时使用校准时写入小模型检查点的值
+cascade_threshold = float(os.environ['SERVE_CASCADE_THRESHOLD']) if os.environ.get('SERVE_CASCADE_THRESHOLD') else None
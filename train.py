@@ -1,10 +1,32 @@
+import os
 import time
 import copy
+import argparse
 import torch
+from torch.nn import functional as F
 from config import filename, device
 
-def train_model(model, dataloaders, dataset_sizes, criterion, optimizer, scheduler, num_epochs=25):
-    """完整训练流程（含验证集监控）"""
+def save_checkpoint(model, best_acc, optimizer, save_path, model_name, **extra):
+    """保存服务端可直接加载的检查点（inference.load_classifier 按 model_name 构建网络结构）"""
+    torch.save({
+        # 权重参数
+        'state_dict': model.state_dict(),
+        # 最佳准确率
+        'best_acc': best_acc,
+        # 优化器状态
+        'optimizer': optimizer.state_dict(),
+        # 网络结构名称
+        'model_name': model_name,
+        **extra
+    }, save_path)
+
+
+def train_model(model, dataloaders, dataset_sizes, criterion, optimizer, scheduler, num_epochs=25,
+                save_path=filename, model_name='resnet18'):
+    """完整训练流程（含验证集监控），验证集最佳模型保存到 save_path
+
+    model_name 为 model.model_registry 中的名称，写入检查点，服务端据此构建网络结构
+    """
     # 计算开始时间
     since = time.time()
     # 初始化准确率
@@ -66,14 +88,7 @@ def train_model(model, dataloaders, dataset_sizes, criterion, optimizer, schedul
                 best_acc = epoch_acc
                 # 深拷贝最佳权重参数
                 best_model_wts = copy.deepcopy(model.state_dict())
-                torch.save({
-                    # 权重参数
-                    'state_dict': model.state_dict(),
-                    # 最佳准确率
-                    'best_acc': best_acc,
-                    # 优化器状态
-                    'optimizer': optimizer.state_dict()
-                }, filename)
+                save_checkpoint(model, best_acc, optimizer, save_path, model_name)
                 print(f'Saved best model (Acc: {best_acc:.4f})')
 
             # 记录训练曲线数据
@@ -97,4 +112,171 @@ def train_model(model, dataloaders, dataset_sizes, criterion, optimizer, schedul
 
     # 加载最佳模型权重
     model.load_state_dict(best_model_wts)
-    return model, val_acc_history, train_acc_history, valid_losses, train_losses
\ No newline at end of file
+    return model, val_acc_history, train_acc_history, valid_losses, train_losses
+
+
+# 知识蒸馏：用训练好的 ResNet18（教师）指导小模型（学生，model.model_registry 中的任一结构）
+# 教师 logits 只计算一次并缓存到磁盘，之后每个 epoch 直接按样本编号查表，训练时不再运行教师
+# 用法: python train.py --student resnet20 --epochs 60 --output cifar10_resnet20_kd.pt
+#       SERVE_WEIGHTS=cifar10_resnet20_kd.pt uvicorn app:app
+
+
+class IndexedDataset(torch.utils.data.Dataset):
+    """在 (图片, 标签) 之外返回样本在 ImageFolder 中的编号，用于查找缓存的教师 logits"""
+
+    def __init__(self, subset):
+        self.subset = subset
+
+    def __len__(self):
+        return len(self.subset)
+
+    def __getitem__(self, index):
+        inputs, label = self.subset[index]
+        return inputs, label, self.subset.indices[index]
+
+
+def cache_teacher_logits(teacher, teacher_version, root, cache_dir, batch_size=256):
+    """计算教师在 root（ImageFolder）全部图片上的 logits，按样本编号保存；缓存已存在时直接读取
+
+    缓存文件名包含教师权重的版本号，教师更新后自动重新计算；
+    使用不做数据增强的预处理，与 data_loader 中训练集实际使用的 transform 一致
+    """
+    from torchvision import datasets
+    from config import get_data_transforms
+    path = os.path.join(cache_dir, f'teacher_logits_{teacher_version}.pt')
+    dataset = datasets.ImageFolder(root=root, transform=get_data_transforms()['valid'])
+    if os.path.exists(path):
+        cached = torch.load(path)
+        if cached['samples'] == [p for p, _ in dataset.samples]:
+            print(f'读取缓存的教师 logits: {path}')
+            return cached['logits']
+    since = time.time()
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=2)
+    outputs = []
+    teacher.eval()
+    with torch.no_grad():
+        for inputs, _ in loader:
+            outputs.append(teacher(inputs.to(device)).float().cpu())
+    logits = torch.cat(outputs)
+    os.makedirs(cache_dir, exist_ok=True)
+    torch.save({'logits': logits, 'samples': [p for p, _ in dataset.samples]}, path)
+    print(f'教师 logits（{len(logits)} 张）计算用时 {time.time() - since:.1f}s -> {path}')
+    return logits
+
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature, alpha):
+    """alpha * T^2 * KL(教师软标签 || 学生软标签) + (1 - alpha) * 交叉熵
+
+    乘 T^2 使软标签部分的梯度量级不随温度变化
+    """
+    soft = F.kl_div(F.log_softmax(student_logits / temperature, dim=1),
+                    F.softmax(teacher_logits / temperature, dim=1), reduction='batchmean')
+    return alpha * temperature ** 2 * soft + (1 - alpha) * F.cross_entropy(student_logits, labels)
+
+
+def distill_model(model, teacher_logits, dataloaders, dataset_sizes, optimizer, scheduler, num_epochs,
+                  temperature=4.0, alpha=0.9, save_path=filename, model_name='resnet18', **extra):
+    """蒸馏训练：训练阶段使用蒸馏损失，验证阶段使用交叉熵，验证集最佳模型保存到 save_path"""
+    since = time.time()
+    best_acc = 0.0
+    best_model_wts = copy.deepcopy(model.state_dict())
+    train_loader = torch.utils.data.DataLoader(IndexedDataset(dataloaders['train'].dataset),
+                                               batch_size=dataloaders['train'].batch_size,
+                                               shuffle=True, num_workers=dataloaders['train'].num_workers)
+
+    for epoch in range(num_epochs):
+        print(f'Epoch {epoch + 1}/{num_epochs}')
+        print('-' * 10)
+
+        model.train()
+        running_loss = 0.0
+        running_corrects = 0
+        for inputs, labels, indices in train_loader:
+            inputs, labels = inputs.to(device), labels.to(device)
+            optimizer.zero_grad()
+            outputs = model(inputs)
+            loss = distillation_loss(outputs, teacher_logits[indices].to(device), labels, temperature, alpha)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * inputs.size(0)
+            running_corrects += torch.sum(outputs.argmax(1) == labels)
+        print(f'train Loss: {running_loss / dataset_sizes["train"]:.4f} '
+              f'Acc: {running_corrects.double() / dataset_sizes["train"]:.4f}')
+
+        model.eval()
+        running_loss = 0.0
+        running_corrects = 0
+        with torch.no_grad():
+            for inputs, labels in dataloaders['valid']:
+                inputs, labels = inputs.to(device), labels.to(device)
+                outputs = model(inputs)
+                running_loss += F.cross_entropy(outputs, labels).item() * inputs.size(0)
+                running_corrects += torch.sum(outputs.argmax(1) == labels)
+        epoch_loss = running_loss / dataset_sizes['valid']
+        epoch_acc = running_corrects.double() / dataset_sizes['valid']
+        print(f'valid Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
+
+        if epoch_acc > best_acc:
+            best_acc = epoch_acc
+            best_model_wts = copy.deepcopy(model.state_dict())
+            save_checkpoint(model, best_acc, optimizer, save_path, model_name, **extra)
+            print(f'Saved best model (Acc: {best_acc:.4f})')
+        scheduler.step(epoch_loss)
+        print()
+
+    time_elapsed = time.time() - since
+    print(f'Distillation complete in {time_elapsed // 60:.0f}m {time_elapsed % 60:.0f}s')
+    print(f'Best val Acc: {best_acc:.4f}')
+    model.load_state_dict(best_model_wts)
+    return model
+
+
+def accuracy(model, loader):
+    model.eval()
+    correct = 0
+    with torch.no_grad():
+        for inputs, labels in loader:
+            correct += (model(inputs.to(device)).argmax(1).cpu() == labels).sum().item()
+    return correct / len(loader.dataset)
+
+
+if __name__ == '__main__':
+    import serve_config
+    from torch import optim
+    from config import seed, set_seed, data_root
+    from data_loader import load_datasets
+    from model import initialize_model, model_registry
+    from inference import load_classifier, weight_path, _file_version
+
+    # 解决 OpenMP 冲突
+    os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+    parser = argparse.ArgumentParser(description='知识蒸馏：训练可直接部署的小模型')
+    parser.add_argument('--student', default='resnet20', choices=[n for n in model_registry if n != 'resnet18'])
+    parser.add_argument('--teacher', default=weight_path, help='教师（ResNet18）权重')
+    parser.add_argument('--output', default=None, help='学生检查点（默认 cifar10_<student>_kd.pt）')
+    parser.add_argument('--epochs', type=int, default=60)
+    parser.add_argument('--lr', type=float, default=0.05)
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.9, help='软标签损失的权重')
+    parser.add_argument('--cache-dir', default=serve_config.artifact_dir, help='教师 logits 缓存目录')
+    args = parser.parse_args()
+    output = args.output or f'cifar10_{args.student}_kd.pt'
+
+    set_seed(seed)
+    dataloaders, dataset_sizes, class_names = load_datasets()
+    teacher = load_classifier(args.teacher, device)
+    teacher_version = _file_version(args.teacher)
+    teacher_logits = cache_teacher_logits(teacher, teacher_version, os.path.join(data_root, 'train'), args.cache_dir)
+
+    student = initialize_model(args.student, len(class_names))
+    optimizer = optim.SGD(student.parameters(), lr=args.lr, momentum=0.9, weight_decay=5e-4, nesterov=True)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=3)
+    distill_model(student, teacher_logits, dataloaders, dataset_sizes, optimizer, scheduler, args.epochs,
+                  args.temperature, args.alpha, save_path=output, model_name=args.student,
+                  distillation={'teacher': teacher_version, 'temperature': args.temperature, 'alpha': args.alpha})
+
+    # 服务端的加载方式读回检查点，确认可以直接部署
+    student = load_classifier(output, device)
+    print(f'测试集准确率: 教师 {accuracy(teacher, dataloaders["test"]):.4f} / '
+          f'学生 {args.student} {accuracy(student, dataloaders["test"]):.4f} -> {output}')
@@ -0,0 +1,127 @@
+import os
+import time
+import argparse
+import torch
+from torch import nn, optim
+import backends
+import serve_config
+from config import seed, set_seed, device
+from data_loader import load_datasets
+from model import initialize_model
+from train import train_model
+from inference import load_classifier, weight_path
+from quantize_model import evaluation_loader
+
+# 解决 OpenMP 冲突
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# 级联推理：训练小模型（model.TinyCNN）-> 在验证集上校准置信度阈值 -> 在测试集上报告提前退出率、准确率与加速比
+# 阈值取“级联准确率不低于 ResNet18 准确率减去 --max-drop”的最小值（提前退出的图片最多），写回小模型检查点
+# 用法: python train_cascade.py --epochs 30
+#       python train_cascade.py --skip-train --max-drop 0.01   # 只重新校准
+#       SERVE_CASCADE=1 uvicorn app:app                        # 服务端启用级联
+
+# 报告中列出的阈值
+report_thresholds = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+def collect(small, large, loader):
+    """在整个数据集上运行两个模型，返回 (小模型置信度, 小模型预测, 大模型预测, 真实标签)"""
+    confidences, small_preds, large_preds, labels = [], [], [], []
+    with torch.no_grad():
+        for inputs, targets in loader:
+            inputs = inputs.to(device)
+            probs = torch.softmax(small(inputs), dim=1)
+            confidence, small_pred = probs.max(dim=1)
+            confidences.append(confidence.cpu())
+            small_preds.append(small_pred.cpu())
+            large_preds.append(large(inputs).argmax(dim=1).cpu())
+            labels.append(targets)
+    return torch.cat(confidences), torch.cat(small_preds), torch.cat(large_preds), torch.cat(labels)
+
+
+def cascade_accuracy(outputs, threshold):
+    """返回 (提前退出比例, 级联准确率)"""
+    confidence, small_pred, large_pred, labels = outputs
+    early = confidence >= threshold
+    preds = torch.where(early, small_pred, large_pred)
+    return early.float().mean().item(), (preds == labels).float().mean().item()
+
+
+def calibrate(outputs, max_drop):
+    """准确率损失不超过 max_drop 的前提下，使提前退出比例最大的阈值"""
+    _, _, large_pred, labels = outputs
+    target = (large_pred == labels).float().mean().item() - max_drop
+    for threshold in [round(value, 3) for value in torch.linspace(0.3, 0.999, 140).tolist()]:
+        _, accuracy = cascade_accuracy(outputs, threshold)
+        if accuracy >= target:
+            return threshold
+    # 小模型始终不够准确：阈值设为 1，全部交给大模型
+    return 1.0
+
+
+def time_per_image(model, loader, batches=20):
+    """按服务端批大小逐批推理的平均每张耗时（秒）"""
+    count, elapsed = 0, 0.0
+    with torch.no_grad():
+        for index, (inputs, _) in enumerate(loader):
+            if index >= batches:
+                break
+            inputs = inputs.to(device)
+            start = time.perf_counter()
+            model(inputs)
+            elapsed += time.perf_counter() - start
+            count += len(inputs)
+    return elapsed / max(count, 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='训练并校准级联推理的小模型')
+    parser.add_argument('--tiny-weights', default=serve_config.cascade_weights)
+    parser.add_argument('--weights', default=weight_path, help='级联第二级（ResNet18）的权重')
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--skip-train', action='store_true', help='直接使用已有的小模型，只做校准和报告')
+    parser.add_argument('--max-drop', type=float, default=0.005, help='允许的准确率下降（绝对值）')
+    args = parser.parse_args()
+
+    set_seed(seed)
+    dataloaders, dataset_sizes, class_names = load_datasets()
+
+    if not args.skip_train:
+        model = initialize_model('tiny_cnn', len(class_names))
+        optimizer = optim.Adam(model.parameters(), lr=args.lr)
+        scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=3)
+        train_model(model, dataloaders, dataset_sizes, nn.CrossEntropyLoss(), optimizer, scheduler,
+                    num_epochs=args.epochs, save_path=args.tiny_weights, model_name='tiny_cnn')
+
+    large = load_classifier(args.weights, device)
+    cascade = backends.load_cascade(large, args.tiny_weights, device, threshold=1.0)
+    small = cascade.small
+
+    # 阈值在验证集上校准，结果在测试集上报告，避免在同一份数据上既选阈值又评估
+    threshold = calibrate(collect(small, large, dataloaders['valid']), args.max_drop)
+    checkpoint = torch.load(args.tiny_weights, map_location='cpu')
+    checkpoint['cascade_threshold'] = threshold
+    torch.save(checkpoint, args.tiny_weights)
+    print(f'校准阈值 {threshold:.3f}（允许准确率下降 {args.max_drop:.3f}）已写入 {args.tiny_weights}')
+
+    loader = evaluation_loader(batch_size=serve_config.max_batch_size)
+    outputs = collect(small, large, loader)
+    small_s = time_per_image(small, loader)
+    large_s = time_per_image(large, loader)
+    _, large_acc = cascade_accuracy(outputs, 2.0)
+    _, small_acc = cascade_accuracy(outputs, 0.0)
+    print(f'\n测试集 {len(outputs[3])} 张，批大小 {serve_config.max_batch_size}；'
+          f'ResNet18 准确率 {large_acc:.4f}，小模型准确率 {small_acc:.4f}，'
+          f'每张耗时 ResNet18 {large_s * 1000:.3f} ms / 小模型 {small_s * 1000:.3f} ms')
+    print(f'\n{"阈值":>8}{"提前退出":>10}{"准确率":>10}{"准确率变化":>12}{"预计加速":>10}')
+    for value in sorted(set(report_thresholds + [threshold])):
+        exit_rate, accuracy = cascade_accuracy(outputs, value)
+        speedup = large_s / (small_s + (1 - exit_rate) * large_s)
+        mark = '  <- 校准值' if value == threshold else ''
+        print(f'{value:>8.3f}{exit_rate:>10.1%}{accuracy:>10.4f}{accuracy - large_acc:>+12.4f}{speedup:>9.2f}x{mark}')
+
+    cascade.threshold = threshold
+    measured = large_s / time_per_image(cascade, loader)
+    print(f'\n实测级联加速（阈值 {threshold:.3f}）: {measured:.2f}x，提前退出 {cascade.stats()["early_exit_rate"]:.1%}')
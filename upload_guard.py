@@ -0,0 +1,94 @@
+import json
+from image_decode import open_checked, UnsupportedImage, TruncatedHeader, ImageTooLarge
+
+# 上传防护：请求体按固定大小的块读取并设硬上限，读到图片头部后立即检查格式与像素数，
+# 超大文件或解压炸弹在读完、解码之前就被拒绝
+
+# 每次读取的块大小
+chunk_bytes = 64 * 1024
+# 读到这么多字节后解析一次图片头部（常见格式的尺寸信息都在开头几 KB 内）；无法识别格式的上传直接拒绝，
+# 头部被截断（EXIF / ICC 段更长）时在缓冲区翻倍后再试，总的解析量与上传大小成线性关系
+header_bytes = 256 * 1024
+
+
+class UploadRejected(Exception):
+    """上传内容不被接受：status_code 为 413（过大）或 415（格式不支持）"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def check_header(contents, max_pixels, complete=True):
+    """检查图片头部：像素数超限抛出 UploadRejected(413)，格式无法识别抛出 UploadRejected(415)
+
+    complete 为 False 表示 contents 只是上传的开头部分：头部被截断时返回 False（需要更多字节），
+    通过检查返回 True
+    """
+    try:
+        open_checked(contents, max_pixels)
+    except ImageTooLarge as e:
+        raise UploadRejected(str(e), 413) from None
+    except TruncatedHeader as e:
+        if not complete:
+            return False
+        raise UploadRejected(str(e), 415) from None
+    except UnsupportedImage as e:
+        raise UploadRejected(str(e), 415) from None
+    return True
+
+
+async def read_limited(chunks, max_bytes, max_pixels):
+    """从异步字节块迭代器读取整个上传内容
+
+    超过 max_bytes 立即抛出 UploadRejected(413)，不再继续读取；
+    读到 header_bytes 字节时检查图片头部，像素数超限或格式不支持的图片提前拒绝；
+    头部被截断时在缓冲区达到 2 倍、4 倍……时再试，仍未通过的在读完后按完整内容检查。
+    """
+    buffer = bytearray()
+    checked = False
+    next_check = header_bytes
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise UploadRejected(f"文件过大（超过 {max_bytes} 字节）", 413)
+        if not checked and len(buffer) >= next_check:
+            checked = check_header(bytes(buffer), max_pixels, complete=False)
+            next_check *= 2
+    contents = bytes(buffer)
+    if not checked:
+        check_header(contents, max_pixels)
+    return contents
+
+
+async def iter_upload_file(upload):
+    """multipart 上传文件（UploadFile）按块读取"""
+    while True:
+        chunk = await upload.read(chunk_bytes)
+        if not chunk:
+            break
+        yield chunk
+
+
+class ContentLengthLimit:
+    """ASGI 中间件：声明的 Content-Length 超过路径上限的请求在读取请求体之前直接返回 413"""
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in self.limits:
+            limit = self.limits[scope['path']]
+            for name, value in scope['headers']:
+                if name == b'content-length' and value.isdigit() and int(value) > limit:
+                    body = json.dumps({"detail": f"请求体过大（超过 {limit} 字节）"}, ensure_ascii=False).encode('utf-8')
+                    await send({
+                        'type': 'http.response.start',
+                        'status': 413,
+                        'headers': [(b'content-type', b'application/json'),
+                                    (b'content-length', str(len(body)).encode('ascii'))],
+                    })
+                    await send({'type': 'http.response.body', 'body': body})
+                    return
+        await self.app(scope, receive, send)
@@ -0,0 +1,149 @@
+import os
+import json
+import numpy as np
+
+# 相似图片检索用的进程内向量索引
+# 向量为 L2 归一化后的 512 维特征（ResNet18 在 fc 之前的输出），内积即余弦相似度
+# exact：全量内积取 top-k，结果精确；
+# ivf：k-means 把向量分成 nlist 个簇（倒排表），查询时只扫描最近的 nprobe 个簇，
+#      各簇向量在磁盘上连续存放，直接按切片读取 float16 memmap
+# 索引文件由 embed_dataset.py 生成
+
+# 查询时用 torch 直接在 float16 矩阵上做矩阵乘法（numpy 的 float16 运算没有 BLAS 加速），
+# float16 分数只有约 3 位有效数字，先多取一些候选，再以 float32 重新打分排序
+# 向量文件以写时复制方式映射，多个进程共享同一份页缓存
+rerank_factor = 4
+# 离线构建索引时按块处理的行数
+build_chunk_rows = 16384
+
+
+def index_paths(artifact_dir, name='train_embeddings'):
+    base = os.path.join(artifact_dir, name)
+    return {
+        'vectors': base + '.npy',
+        'meta': base + '.json',
+        'ivf': base + '.ivf.npz',
+        'ivf_vectors': base + '.ivf.npy',
+    }
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _as_half(vectors):
+    import torch
+    return torch.from_numpy(vectors) if vectors.dtype == np.float16 else torch.from_numpy(vectors).half()
+
+
+class ExactIndex:
+    """精确检索：查询向量与全部向量做内积，torch.topk 取前 k 个"""
+
+    def __init__(self, vectors):
+        self.vectors = _as_half(vectors)
+        self.size = len(vectors)
+
+    def search(self, queries, k):
+        """queries 为 QxD 归一化向量，返回 (分数 QxK, 向量编号 QxK) 两个 numpy 数组"""
+        import torch
+        queries = torch.from_numpy(np.asarray(queries, dtype=np.float32))
+        rough = queries.half() @ self.vectors.T
+        candidates = torch.topk(rough.float(), min(k * rerank_factor, self.size), dim=1).indices
+        # 候选向量以 float32 重新计算内积
+        scores = torch.einsum('qd,qcd->qc', queries, self.vectors[candidates].float())
+        top = torch.topk(scores, min(k, self.size), dim=1)
+        return top.values.numpy(), torch.gather(candidates, 1, top.indices).numpy()
+
+
+def train_kmeans(vectors, nlist, iterations=20, sample=50000, seed=0):
+    """球面 k-means（余弦距离），返回 nlist x D 的归一化簇中心"""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors)
+    if len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=nlist)
+        # 空簇重新随机取一个点，避免中心退化
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign(vectors, centroids):
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), build_chunk_rows):
+        chunk = np.asarray(vectors[start:start + build_chunk_rows], dtype=np.float32)
+        assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignment
+
+
+def build_ivf(vectors, paths, nlist, iterations=20):
+    """训练簇中心，按簇重新排列向量写入 ivf_vectors，簇边界与原始编号写入 ivf"""
+    centroids = train_kmeans(vectors, nlist, iterations)
+    assignment = assign(vectors, centroids)
+    ids = np.argsort(assignment, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))])
+    reordered = np.lib.format.open_memmap(paths['ivf_vectors'], mode='w+', dtype=np.float16, shape=vectors.shape)
+    for start in range(0, len(ids), build_chunk_rows):
+        reordered[start:start + build_chunk_rows] = vectors[ids[start:start + build_chunk_rows]]
+    reordered.flush()
+    np.savez(paths['ivf'], centroids=centroids, offsets=offsets, ids=ids)
+
+
+class IVFIndex:
+    """倒排文件索引：只扫描与查询最接近的 nprobe 个簇"""
+
+    def __init__(self, centroids, offsets, ids, vectors, nprobe=8):
+        self.centroids = _as_half(np.asarray(centroids, dtype=np.float32))
+        self.offsets = offsets.tolist()
+        self.ids = ids
+        self.vectors = _as_half(vectors)
+        self.nprobe = max(1, min(int(nprobe), len(centroids)))
+        self.size = len(ids)
+
+    def search(self, queries, k):
+        import torch
+        queries = _as_half(np.asarray(queries, dtype=np.float32))
+        probes = torch.topk((queries @ self.centroids.T).float(), self.nprobe, dim=1).indices.tolist()
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, lists in enumerate(probes):
+            ranges = [(self.offsets[c], self.offsets[c + 1]) for c in lists if self.offsets[c + 1] > self.offsets[c]]
+            if not ranges:
+                continue
+            candidates = torch.cat([self.vectors[start:end] for start, end in ranges])
+            top = torch.topk(candidates.float() @ queries[row].float(), min(k, len(candidates)))
+            # 候选行号 -> 重排后矩阵中的行号 -> 原始向量编号
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            count = len(top.values)
+            all_scores[row, :count] = top.values.numpy()
+            all_ids[row, :count] = self.ids[rows[top.indices.numpy()]]
+        return all_scores, all_ids
+
+
+def load_index(artifact_dir, kind='ivf', nprobe=8):
+    """加载 embed_dataset.py 生成的索引，返回 (索引, 元数据)；ivf 文件不存在时退回精确检索"""
+    paths = index_paths(artifact_dir)
+    if not os.path.exists(paths['vectors']):
+        raise FileNotFoundError(f"向量文件不存在: {paths['vectors']}，请先运行 python embed_dataset.py")
+    with open(paths['meta'], encoding='utf-8') as f:
+        meta = json.load(f)
+    if kind == 'ivf' and os.path.exists(paths['ivf']):
+        ivf = np.load(paths['ivf'])
+        vectors = np.load(paths['ivf_vectors'], mmap_mode='c')
+        return IVFIndex(ivf['centroids'], ivf['offsets'], ivf['ids'], vectors, nprobe), meta
+    return ExactIndex(np.load(paths['vectors'], mmap_mode='c')), meta
+
+
+def recall_at_k(reference_ids, candidate_ids):
+    """近似检索结果中与精确 top-k 重合的比例"""
+    hits = sum(len(set(r) & set(c)) for r, c in zip(reference_ids.tolist(), candidate_ids.tolist()))
+    return hits / reference_ids.size